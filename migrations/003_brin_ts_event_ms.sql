@@ -0,0 +1,42 @@
+-- Migration: BRIN indexes on ts_event_ms for the high-volume okx_raw tables
+-- Purpose: Serve cross-instrument time-slice queries (filter on ts_event_ms only);
+--          the primary keys lead with instid and cannot serve them
+--
+-- The collector bootstrap creates these indexes only on empty tables (fresh install).
+-- Existing deployments run this file once.
+--
+-- CONCURRENTLY requires no transaction block: run each statement separately
+-- (e.g. psql without --single-transaction). Inserts keep running during the build.
+
+-- ============================================================================
+-- STEP 1: Create BRIN indexes (run OUTSIDE transaction!)
+-- ============================================================================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trades_ts_event_ms_brin
+ON okx_raw.trades USING brin (ts_event_ms);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tickers_ts_event_ms_brin
+ON okx_raw.tickers USING brin (ts_event_ms);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orderbook_snapshots_ts_event_ms_brin
+ON okx_raw.orderbook_snapshots USING brin (ts_event_ms);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orderbook_updates_ts_event_ms_brin
+ON okx_raw.orderbook_updates USING brin (ts_event_ms);
+
+-- ============================================================================
+-- VALIDATION QUERIES
+-- ============================================================================
+-- 1. Indexes exist and are valid (a failed CONCURRENTLY build leaves an INVALID index:
+--    drop it and re-run the statement)
+-- SELECT c.relname, i.indisvalid
+-- FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+-- JOIN pg_namespace n ON n.oid = c.relnamespace
+-- WHERE n.nspname = 'okx_raw' AND c.relname LIKE '%_ts_event_ms_brin';
+
+-- ============================================================================
+-- ROLLBACK (if needed)
+-- ============================================================================
+-- DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_trades_ts_event_ms_brin;
+-- DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_tickers_ts_event_ms_brin;
+-- DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_orderbook_snapshots_ts_event_ms_brin;
+-- DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_orderbook_updates_ts_event_ms_brin;
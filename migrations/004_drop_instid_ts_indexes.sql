@@ -0,0 +1,41 @@
+-- Migration: Drop idx_<table>_instid_ts indexes duplicated by the primary keys
+-- Purpose: Every primary key starts with (instid, ts_event_ms), so these btrees serve
+--          no query the PK index cannot; they only add an index insert and WAL per row
+--
+-- The collector bootstrap no longer creates these indexes, so fresh installs never have them.
+-- Existing deployments run this file once.
+--
+-- CONCURRENTLY requires no transaction block: run each statement separately
+-- (e.g. psql without --single-transaction). Inserts keep running during the drop.
+
+-- ============================================================================
+-- STEP 1: Drop duplicate indexes (run OUTSIDE transaction!)
+-- ============================================================================
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_trades_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_funding_rates_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_mark_prices_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_tickers_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_open_interest_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_orderbook_snapshots_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_orderbook_updates_instid_ts;
+DROP INDEX CONCURRENTLY IF EXISTS okx_raw.idx_index_tickers_instid_ts;
+
+-- ============================================================================
+-- VALIDATION QUERIES
+-- ============================================================================
+-- 1. No idx_*_instid_ts indexes remain
+-- SELECT indexname FROM pg_indexes
+-- WHERE schemaname = 'okx_raw' AND indexname LIKE 'idx\_%\_instid\_ts';
+-- Expected: 0 rows
+
+-- ============================================================================
+-- ROLLBACK (if needed)
+-- ============================================================================
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trades_instid_ts ON okx_raw.trades(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funding_rates_instid_ts ON okx_raw.funding_rates(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mark_prices_instid_ts ON okx_raw.mark_prices(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tickers_instid_ts ON okx_raw.tickers(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_open_interest_instid_ts ON okx_raw.open_interest(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orderbook_snapshots_instid_ts ON okx_raw.orderbook_snapshots(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orderbook_updates_instid_ts ON okx_raw.orderbook_updates(instid, ts_event_ms);
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_index_tickers_instid_ts ON okx_raw.index_tickers(instid, ts_event_ms);
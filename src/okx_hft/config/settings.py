@@ -43,10 +43,31 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = "okx_hft"
     POSTGRES_SCHEMA: str = "okx_raw"
+    # create_pool opens min_size connections up front so the first write burst
+    # after boot never waits on connect + auth; None = INSERT_CONCURRENCY, the
+    # most connections inserts ever hold at once
+    POSTGRES_POOL_MIN_SIZE: int | None = None
+    POSTGRES_POOL_MAX_SIZE: int = 10
+    # asyncpg prepared statement cache per connection; set 0 when PgBouncer
+    # runs in transaction mode without max_prepared_statements (< 1.21)
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 1024
+    # True (default, POSTGRES_PORT points at PgBouncer): temp tables do not survive
+    # between transactions under transaction pooling, so every COPY chunk creates
+    # (and drops) its staging table. False keeps one per connection (direct
+    # PostgreSQL or PgBouncer in session mode)
+    POSTGRES_PGBOUNCER_TRANSACTION_MODE: bool = True
+    # False: COPY batches commit without waiting for the WAL flush; a DB server
+    # crash may lose the last ~200ms of rows (see storage/postgres.py)
+    POSTGRES_SYNCHRONOUS_COMMIT: bool = False
 
     BATCH_MAX_SIZE: int = 5000
     FLUSH_INTERVAL_MS: int = 150
 
+    # DB insert tuning: rows per executemany chunk and max concurrent inserts
+    # (concurrency is capped at POSTGRES_POOL_MAX_SIZE)
+    INSERT_BATCH_SIZE: int = 5000
+    INSERT_CONCURRENCY: int = 4
+
     # Orderbook snapshot settings
     SNAPSHOT_INTERVAL_SEC: float = 30.0  # Default interval for periodic snapshots
     ORDERBOOK_MAX_DEPTH: int = 50  # Max depth levels to store
@@ -54,6 +75,13 @@ class Settings(BaseSettings):
     BACKOFF_BASE: float = 0.5
     BACKOFF_CAP: float = 30.0
 
+    # Number of collector processes; INSTRUMENTS are split between them and
+    # shard N serves metrics on METRICS_PORT + N
+    WS_SHARDS: int = 1
+    # Linux only: pin each process to one CPU (shard N -> CPU_AFFINITY[N % len]);
+    # empty list leaves scheduling to the OS
+    CPU_AFFINITY: List[int] = Field(default_factory=list)
+
     METRICS_PORT: int = 9108
     LOG_LEVEL: str = "INFO"
 
@@ -2,6 +2,7 @@
 OrderBookL2 - in-memory order book state management
 """
 import uuid
+from itertools import islice
 from typing import Dict, List, Optional, Tuple, Any
 from collections import OrderedDict
 from okx_hft.utils.logging import get_logger
@@ -200,7 +201,7 @@ class OrderBookL2:
         limit = max_levels or self.max_depth
         
         # Add bid levels (top N, highest price first)
-        for idx, (price_str, size_str) in enumerate(list(self.bids.items())[:limit]):
+        for idx, (price_str, size_str) in enumerate(islice(self.bids.items(), limit)):
             try:
                 # Convert to float
                 price = float(price_str)
@@ -223,7 +224,7 @@ class OrderBookL2:
                 continue
         
         # Add ask levels (top N, lowest price first)
-        for idx, (price_str, size_str) in enumerate(list(self.asks.items())[:limit]):
+        for idx, (price_str, size_str) in enumerate(islice(self.asks.items(), limit)):
             try:
                 # Convert to float
                 price = float(price_str)
@@ -1,5 +1,6 @@
 from prometheus_client import start_http_server, Counter, Gauge, Summary
 from okx_hft.utils.logging import get_logger
+from typing import Dict, Tuple
 import time, asyncio
 
 log = get_logger(__name__)
@@ -15,18 +16,63 @@ event_loop_lag_ms = Gauge("event_loop_lag_ms", "Event loop lag in ms", [])
 ws_roundtrip_ms = Summary(
     "ws_roundtrip_ms", "WebSocket ping-pong round-trip time ms", []
 )
+db_insert_batch_rows = Summary(
+    "db_insert_batch_rows", "Rows per DB insert statement batch", ["table"]
+)
+db_inserts_in_flight = Gauge(
+    "db_inserts_in_flight", "DB inserts currently in progress", []
+)
+
+
+class BatchedCounter:
+    """Accumulates increments in a plain dict and pushes them to the Prometheus
+    counter on flush(), keeping label lookup and locking off the per-message path."""
+
+    def __init__(self, metric: Counter) -> None:
+        self._m = metric
+        self._buf: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], n: float = 1) -> None:
+        buf = self._buf
+        buf[labels] = buf.get(labels, 0) + n
+
+    def flush(self) -> None:
+        if not self._buf:
+            return
+        buf, self._buf = self._buf, {}
+        for lbl, n in buf.items():
+            self._m.labels(*lbl).inc(n)
+
+
+events_batched = BatchedCounter(events_total)
+_batched_counters = (events_batched,)
+
+
+def flush_batched_counters() -> None:
+    for counter in _batched_counters:
+        counter.flush()
+
+
+async def flush_batched_counters_loop(interval: float = 1.0) -> None:
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            flush_batched_counters()
+    finally:
+        flush_batched_counters()
 
 
-async def monitor_loop_lag() -> None:
+async def monitor_loop_lag(interval: float = 1.0) -> None:
+    # Lag = how late the loop wakes us up relative to the requested sleep
+    perf = time.perf_counter
     while True:
-        t0 = time.perf_counter()
-        await asyncio.sleep(0)
-        lag = (time.perf_counter() - t0) * 1000.0
-        event_loop_lag_ms.set(lag)
-        await asyncio.sleep(1.0)
+        t0 = perf()
+        await asyncio.sleep(interval)
+        drift_ms = (perf() - t0 - interval) * 1000.0
+        event_loop_lag_ms.set(max(0.0, drift_ms))
 
 
 async def run_metrics_server(port: int = 9108) -> None:
     start_http_server(port)
     log.info(f"metrics_started on port {port}")
-    await monitor_loop_lag()
+    await asyncio.gather(monitor_loop_lag(), flush_batched_counters_loop())
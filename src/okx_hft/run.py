@@ -1,5 +1,8 @@
 
 import asyncio
+import multiprocessing
+import os
+import signal
 from okx_hft.config.settings import Settings
 from okx_hft.ws.client import OKXWebSocketClient
 from okx_hft.metrics.server import run_metrics_server
@@ -8,9 +11,36 @@ from okx_hft.utils.logging import get_logger
 log = get_logger(__name__)
 
 
-async def main() -> None:
+def shard_settings(settings: Settings, shard: int, shards: int) -> Settings:
+    """Настройки для одного шарда: свой срез инструментов и свой порт метрик"""
+    return settings.model_copy(update={
+        "INSTRUMENTS": settings.INSTRUMENTS[shard::shards],
+        "INDEX_INSTRUMENTS": settings.INDEX_INSTRUMENTS[shard::shards],
+        "METRICS_PORT": settings.METRICS_PORT + shard,
+    })
+
+
+def pin_cpu(cpus: list[int], shard: int) -> None:
+    """Закрепить процесс за одним ядром из CPU_AFFINITY (шард N -> cpus[N % len])"""
+    if not cpus:
+        return
+    if not hasattr(os, "sched_setaffinity"):
+        log.warning("CPU_AFFINITY is set but not supported on this platform")
+        return
+    cpu = cpus[shard % len(cpus)]
+    try:
+        os.sched_setaffinity(0, {cpu})
+        log.info(f"Pinned shard {shard} to CPU {cpu}")
+    except OSError as e:
+        log.warning(f"Failed to pin shard {shard} to CPU {cpu}: {e}")
+
+
+async def main(shard: int = 0, shards: int = 1) -> None:
     settings = Settings()
-    log.info(f"settings_loaded: {settings.model_dump()}")
+    if shards > 1:
+        settings = shard_settings(settings, shard, shards)
+    log.info(f"settings_loaded: shard={shard}/{shards} {settings.model_dump()}")
+    pin_cpu(settings.CPU_AFFINITY, shard)
     metrics_task = asyncio.create_task(run_metrics_server(port=settings.METRICS_PORT))
     client = OKXWebSocketClient(settings=settings)
     
@@ -54,5 +84,89 @@ async def main() -> None:
             log.info("Соединение с PostgreSQL закрыто")
 
 
+def install_uvloop() -> None:
+    """Use uvloop's libuv-based event loop when available (not on Windows)"""
+    try:
+        import uvloop
+    except ImportError:
+        log.info("uvloop not installed, using default asyncio event loop")
+        return
+    uvloop.install()
+    log.info("uvloop event loop installed")
+
+
+async def _serve(shard: int = 0, shards: int = 1) -> None:
+    """main() с корректной остановкой по SIGTERM (docker stop).
+    
+    По умолчанию SIGTERM убивает процесс сразу, и finally в main() (финальный
+    сброс, закрытие пула) не выполняется. Отмена задачи проходит тот же путь,
+    что и Ctrl-C.
+    """
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    except NotImplementedError:
+        # Windows: обработчики сигналов в цикле событий не поддерживаются
+        pass
+    await main(shard, shards)
+
+
+def shard_count(settings: Settings) -> int:
+    """Число шардов: WS_SHARDS, но не больше числа инструментов
+    (пустой шард нечего подписывать)"""
+    return max(1, min(settings.WS_SHARDS, len(settings.INSTRUMENTS)))
+
+
+def _run_shard(shard: int, shards: int) -> None:
+    # Своя группа процессов: Ctrl-C из терминала получает только родитель и
+    # пересылает его один раз (иначе второй SIGINT прервал бы финальный сброс)
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    install_uvloop()
+    try:
+        asyncio.run(_serve(shard, shards))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # main() уже отменён и дождался финального сброса
+        pass
+
+
+def run_shards(shards: int) -> None:
+    """Запуск коллектора в нескольких процессах (по ядру на шард).
+    
+    Инструменты делятся между процессами; у каждого свои WS-соединение,
+    пул PostgreSQL и сервер метрик (METRICS_PORT + номер шарда).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_run_shard, args=(shard, shards), name=f"okx-hft-shard-{shard}")
+        for shard in range(shards)
+    ]
+    
+    # Пересылаем SIGTERM (docker stop) и SIGINT (Ctrl-C) дочерним процессам:
+    # оба сигнала шард обрабатывает как корректную остановку (см. _serve),
+    # сам родитель просто дожидается их завершения
+    def _forward(signum, frame) -> None:
+        for proc in procs:
+            if proc.is_alive():
+                os.kill(proc.pid, signum)
+    
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    shards = shard_count(Settings())
+    if shards > 1:
+        run_shards(shards)
+    else:
+        install_uvloop()
+        try:
+            asyncio.run(_serve())
+        except asyncio.CancelledError:
+            # Остановлен по SIGTERM после финального сброса
+            pass
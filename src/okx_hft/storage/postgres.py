@@ -1,10 +1,290 @@
+"""
+PostgreSQL storage for OKX market data.
+
+Durability: by default the COPY write path (trades, tickers, orderbook
+snapshots) commits with synchronous_commit=off. A database server crash can
+lose the last few hundred milliseconds of acknowledged rows (wal_writer_delay,
+200ms by default); it cannot corrupt data or leave partial batches. Market data
+can be re-collected, so this trades a small loss window for not waiting on a
+WAL flush per chunk. Pass synchronous_commit=True to restore full durability.
+"""
 from okx_hft.storage.interfaces import IStorage
-from typing import Dict, Any, Sequence
+from typing import Callable, Dict, Any, List, Sequence, Tuple
+import asyncio
+from operator import itemgetter
 import asyncpg
+import orjson
+from okx_hft.metrics.server import db_insert_batch_rows, db_inserts_in_flight
 from okx_hft.utils.logging import get_logger
 
 log = get_logger(__name__)
 
+# Errors after which an insert chunk is safe to retry on a fresh connection.
+# Every INSERT uses ON CONFLICT DO NOTHING, so a replayed chunk cannot duplicate rows.
+# InterfaceError is deliberately absent: asyncpg's client-side DataError (bad query
+# arguments) subclasses it and fails the same way on every attempt. A dropped
+# connection surfaces as ConnectionDoesNotExistError, a PostgresConnectionError.
+_RETRYABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.exceptions.TooManyConnectionsError,
+    asyncpg.exceptions.CannotConnectNowError,
+)
+INSERT_RETRY_ATTEMPTS = 3
+INSERT_RETRY_BASE_DELAY = 0.5
+
+_dumps = orjson.dumps
+_loads = orjson.loads
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    # Binary jsonb wire format: version byte 1 followed by the JSON text
+    return b"\x01" + _dumps(value)
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    return _loads(data[1:])
+
+# Schema bootstrap, sent as one multi-statement script (a single round-trip).
+# Rendered with str.format(schema=...); every statement is idempotent.
+_SCHEMA_DDL = """
+-- Serialize bootstrap across collector processes (WS_SHARDS): concurrent
+-- CREATE ... IF NOT EXISTS can still fail on catalog unique constraints
+SELECT pg_advisory_xact_lock(hashtext('okx_hft_schema_{schema}'));
+
+CREATE SCHEMA IF NOT EXISTS "{schema}";
+
+-- trades
+CREATE TABLE IF NOT EXISTS "{schema}".trades (
+    instid VARCHAR(50) NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    tradeid VARCHAR(100) NOT NULL,
+    px DOUBLE PRECISION NOT NULL,
+    sz DOUBLE PRECISION NOT NULL,
+    side VARCHAR(10) NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms, tradeid)
+);
+
+-- funding_rates
+CREATE TABLE IF NOT EXISTS "{schema}".funding_rates (
+    instid VARCHAR(50) NOT NULL,
+    fundingrate DOUBLE PRECISION NOT NULL,
+    fundingtime BIGINT NOT NULL,
+    nextfundingtime BIGINT NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+
+-- mark_prices
+CREATE TABLE IF NOT EXISTS "{schema}".mark_prices (
+    instid VARCHAR(50) NOT NULL,
+    markpx DOUBLE PRECISION NOT NULL,
+    idxpx DOUBLE PRECISION NOT NULL,
+    idxts BIGINT NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+
+-- tickers
+CREATE TABLE IF NOT EXISTS "{schema}".tickers (
+    instid VARCHAR(50) NOT NULL,
+    last DOUBLE PRECISION,
+    lastsz DOUBLE PRECISION,
+    bidpx DOUBLE PRECISION,
+    bidsz DOUBLE PRECISION,
+    askpx DOUBLE PRECISION,
+    asksz DOUBLE PRECISION,
+    open24h DOUBLE PRECISION,
+    high24h DOUBLE PRECISION,
+    low24h DOUBLE PRECISION,
+    vol24h DOUBLE PRECISION,
+    volccy24h DOUBLE PRECISION,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+
+-- open_interest
+CREATE TABLE IF NOT EXISTS "{schema}".open_interest (
+    instid VARCHAR(50) NOT NULL,
+    oi DOUBLE PRECISION NOT NULL,
+    oiccy DOUBLE PRECISION NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+
+-- orderbook_snapshots
+CREATE TABLE IF NOT EXISTS "{schema}".orderbook_snapshots (
+    snapshot_id UUID NOT NULL,
+    instid VARCHAR(50) NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    side SMALLINT NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    size DOUBLE PRECISION NOT NULL,
+    level SMALLINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms, snapshot_id, side, price)
+);
+-- incremental sync watermark
+CREATE INDEX IF NOT EXISTS idx_orderbook_snapshots_ts_ingest_ms
+    ON "{schema}".orderbook_snapshots(ts_ingest_ms);
+
+-- orderbook_updates (JSONB for nested data)
+CREATE TABLE IF NOT EXISTS "{schema}".orderbook_updates (
+    instid VARCHAR(50) NOT NULL,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    bids_delta JSONB,
+    asks_delta JSONB,
+    checksum BIGINT,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+-- incremental sync watermark
+CREATE INDEX IF NOT EXISTS idx_orderbook_updates_ts_ingest_ms
+    ON "{schema}".orderbook_updates(ts_ingest_ms);
+
+-- index_tickers
+CREATE TABLE IF NOT EXISTS "{schema}".index_tickers (
+    instid VARCHAR(50) NOT NULL,
+    idxpx DOUBLE PRECISION NOT NULL,
+    open24h DOUBLE PRECISION,
+    high24h DOUBLE PRECISION,
+    low24h DOUBLE PRECISION,
+    sodutc0 DOUBLE PRECISION,
+    sodutc8 DOUBLE PRECISION,
+    ts_event_ms BIGINT NOT NULL,
+    ts_ingest_ms BIGINT NOT NULL,
+    PRIMARY KEY (instid, ts_event_ms)
+);
+
+-- BRIN indexes for cross-instrument time slices (filter on ts_event_ms only).
+-- The primary keys lead with instid and cannot serve these; BRIN stays tiny
+-- and is nearly free to maintain on append-mostly tables.
+-- Built here only on empty tables (fresh install): a plain CREATE INDEX on a
+-- populated table blocks inserts for the whole build. Existing deployments
+-- get them from migrations/003_brin_ts_event_ms.sql (CONCURRENTLY).
+DO $$
+DECLARE
+    tbl TEXT;
+    has_rows BOOLEAN;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['trades', 'tickers', 'orderbook_snapshots', 'orderbook_updates'] LOOP
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I.%I)', '{schema}', tbl) INTO has_rows;
+        IF NOT has_rows THEN
+            EXECUTE format(
+                'CREATE INDEX IF NOT EXISTS %I ON %I.%I USING brin (ts_event_ms)',
+                'idx_' || tbl || '_ts_event_ms_brin', '{schema}', tbl
+            );
+        END IF;
+    END LOOP;
+END $$;
+"""
+
+# Hot tables written with binary COPY through a staging table (see _copy_chunk).
+# Column order must match the row extractors below.
+_COPY_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "trades": ("instid", "ts_event_ms", "tradeid", "px", "sz", "side", "ts_ingest_ms"),
+    "tickers": (
+        "instid", "last", "lastsz", "bidpx", "bidsz", "askpx", "asksz",
+        "open24h", "high24h", "low24h", "vol24h", "volccy24h", "ts_event_ms", "ts_ingest_ms",
+    ),
+    "orderbook_snapshots": (
+        "snapshot_id", "instid", "ts_event_ms", "ts_ingest_ms", "side", "price", "size", "level",
+    ),
+}
+_COPY_CONFLICT_KEYS: Dict[str, str] = {
+    "trades": "instid, ts_event_ms, tradeid",
+    "tickers": "instid, ts_event_ms",
+    "orderbook_snapshots": "instid, ts_event_ms, snapshot_id, side, price",
+}
+
+# Row extractors: one C-level call per row instead of a dict lookup per column.
+_TRADE_ROW = itemgetter(
+    "instId",
+    "ts_event_ms",
+    "tradeId",
+    "px",
+    "sz",
+    "side",
+    "ts_ingest_ms",
+)
+_FUNDING_RATE_ROW = itemgetter(
+    "instId",
+    "fundingRate",
+    "fundingTime",
+    "nextFundingTime",
+    "ts_event_ms",
+    "ts_ingest_ms",
+)
+_MARK_PRICE_ROW = itemgetter(
+    "instId",
+    "markPx",
+    "idxPx",
+    "idxTs",
+    "ts_event_ms",
+    "ts_ingest_ms",
+)
+_TICKER_ROW = itemgetter(
+    "instId",
+    "last",
+    "lastSz",
+    "bidPx",
+    "bidSz",
+    "askPx",
+    "askSz",
+    "open24h",
+    "high24h",
+    "low24h",
+    "vol24h",
+    "volCcy24h",
+    "ts_event_ms",
+    "ts_ingest_ms",
+)
+_OPEN_INTEREST_ROW = itemgetter(
+    "instId",
+    "oi",
+    "oiCcy",
+    "ts_event_ms",
+    "ts_ingest_ms",
+)
+_ORDERBOOK_SNAPSHOT_ROW = itemgetter(
+    "snapshot_id",
+    "instId",
+    "ts_event_ms",
+    "ts_ingest_ms",
+    "side",
+    "price",
+    "size",
+    "level",
+)
+_INDEX_TICKER_ROW = itemgetter(
+    "instId",
+    "idxPx",
+    "open24h",
+    "high24h",
+    "low24h",
+    "sodUtc0",
+    "sodUtc8",
+    "ts_event_ms",
+    "ts_ingest_ms",
+)
+
+
+def _orderbook_update_row(update: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        update["instId"],
+        update["ts_event_ms"],
+        update["ts_ingest_ms"],
+        update.get("bids_delta", []),
+        update.get("asks_delta", []),
+        update.get("checksum", 0),
+    )
+
 
 class PostgreSQLStorage(IStorage):
     def __init__(
@@ -14,7 +294,14 @@ class PostgreSQLStorage(IStorage):
         user: str = "",
         password: str = "",
         database: str = "okx_hft",
-        schema: str = "okx_raw"
+        schema: str = "okx_raw",
+        insert_batch_size: int = 5000,
+        insert_concurrency: int = 4,
+        pool_min_size: int | None = None,
+        pool_max_size: int = 10,
+        statement_cache_size: int = 1024,
+        synchronous_commit: bool = False,
+        pgbouncer_transaction_mode: bool = True,
     ) -> None:
         self.host = host
         self.port = port
@@ -22,407 +309,323 @@ class PostgreSQLStorage(IStorage):
         self.password = password
         self.database = database
         self.schema = schema
+        self.insert_batch_size = insert_batch_size
+        self.pool_max_size = pool_max_size
+        self.statement_cache_size = statement_cache_size
+        self.synchronous_commit = synchronous_commit
+        self.pgbouncer_transaction_mode = pgbouncer_transaction_mode
+        if insert_concurrency > pool_max_size:
+            log.warning(
+                "insert_concurrency=%d exceeds pool_max_size=%d, capping to pool size",
+                insert_concurrency, pool_max_size,
+            )
+            insert_concurrency = pool_max_size
+        self.insert_concurrency = insert_concurrency
+        if pool_min_size is None:
+            # Pre-open only the connections the insert semaphore can use at once;
+            # the rest of the pool is opened on demand (e.g. the schema connection)
+            pool_min_size = insert_concurrency
+        self.pool_min_size = min(pool_min_size, pool_max_size)
         self.pool: asyncpg.Pool | None = None
+        # Caps concurrent inserts across all tables (handlers flush in parallel)
+        self._insert_sem = asyncio.Semaphore(insert_concurrency)
+        # Inserts started but not finished (including ones waiting on the semaphore)
+        self._pending_inserts = 0
+        self._inserts_idle = asyncio.Event()
+        self._inserts_idle.set()
+        self._insert_sql = self._build_insert_sql()
+        self._stage_ddl = self._build_stage_ddl()
+        self._copy_sql = self._build_copy_sql()
         
         log.info(
-            f"Initializing PostgreSQLStorage: "
-            f"host={host}, port={port}, database={database}, schema={schema}"
+            "Initializing PostgreSQLStorage: "
+            "host=%s, port=%s, database=%s, schema=%s, "
+            "insert_batch_size=%d, insert_concurrency=%d, pool_size=%d..%d",
+            host, port, database, schema,
+            insert_batch_size, self.insert_concurrency, self.pool_min_size, pool_max_size,
+        )
+
+    def _build_insert_sql(self) -> Dict[str, str]:
+        """Render INSERT statements once for tables written with executemany"""
+        schema = self.schema
+        return {
+            "funding_rates": (
+                f'INSERT INTO "{schema}".funding_rates '
+                "(instid, fundingrate, fundingtime, nextfundingtime, ts_event_ms, ts_ingest_ms) "
+                "VALUES ($1, $2, $3, $4, $5, $6) "
+                "ON CONFLICT (instid, ts_event_ms) DO NOTHING"
+            ),
+            "mark_prices": (
+                f'INSERT INTO "{schema}".mark_prices '
+                "(instid, markpx, idxpx, idxts, ts_event_ms, ts_ingest_ms) "
+                "VALUES ($1, $2, $3, $4, $5, $6) "
+                "ON CONFLICT (instid, ts_event_ms) DO NOTHING"
+            ),
+            "open_interest": (
+                f'INSERT INTO "{schema}".open_interest '
+                "(instid, oi, oiccy, ts_event_ms, ts_ingest_ms) "
+                "VALUES ($1, $2, $3, $4, $5) "
+                "ON CONFLICT (instid, ts_event_ms) DO NOTHING"
+            ),
+            "index_tickers": (
+                f'INSERT INTO "{schema}".index_tickers '
+                "(instid, idxpx, open24h, high24h, low24h, sodutc0, sodutc8, ts_event_ms, ts_ingest_ms) "
+                "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) "
+                "ON CONFLICT (instid, ts_event_ms) DO NOTHING"
+            ),
+            "orderbook_updates": (
+                f'INSERT INTO "{schema}".orderbook_updates '
+                "(instid, ts_event_ms, ts_ingest_ms, bids_delta, asks_delta, checksum) "
+                "VALUES ($1, $2, $3, $4, $5, $6) "
+                "ON CONFLICT (instid, ts_event_ms) DO NOTHING"
+            ),
+        }
+
+    def _build_stage_ddl(self) -> str:
+        """Render the staging table DDL for COPY tables, one statement per table"""
+        # Session mode: created once per pooled connection, ON COMMIT DELETE ROWS
+        # empties it after every merge without touching the system catalogs.
+        # PgBouncer transaction mode: the next transaction may run on another server
+        # connection, so each COPY creates its own table, dropped at commit.
+        on_commit = "DROP" if self.pgbouncer_transaction_mode else "DELETE ROWS"
+        exists = "" if self.pgbouncer_transaction_mode else "IF NOT EXISTS "
+        return "; ".join(
+            f"CREATE TEMP TABLE {exists}_stage_{table} "
+            f'(LIKE "{self.schema}".{table} INCLUDING DEFAULTS) ON COMMIT {on_commit}'
+            for table in _COPY_COLUMNS
         )
 
+    def _build_copy_sql(self) -> Dict[str, Tuple[str | None, str]]:
+        """Render (per-transaction staging DDL or None, merge into target) for COPY tables"""
+        # SET LOCAL is scoped to the COPY transaction, so it also holds behind
+        # PgBouncer in transaction mode; it rides in the same simple query as the merge
+        prefix = "" if self.synchronous_commit else "SET LOCAL synchronous_commit = off; "
+        statements = {}
+        for table, columns in _COPY_COLUMNS.items():
+            cols = ", ".join(columns)
+            create_sql = None
+            if self.pgbouncer_transaction_mode:
+                create_sql = (
+                    f"CREATE TEMP TABLE _stage_{table} "
+                    f'(LIKE "{self.schema}".{table} INCLUDING DEFAULTS) ON COMMIT DROP'
+                )
+            statements[table] = (
+                create_sql,
+                f'{prefix}INSERT INTO "{self.schema}".{table} ({cols}) '
+                f"SELECT {cols} FROM _stage_{table} "
+                f"ON CONFLICT ({_COPY_CONFLICT_KEYS[table]}) DO NOTHING",
+            )
+        return statements
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """Per-connection setup, run once when the pool opens a new connection"""
+        # Send jsonb as binary straight from orjson bytes: no str round-trip on our
+        # side and no JSON text parsing on the server
+        await conn.set_type_codec(
+            "jsonb",
+            encoder=_encode_jsonb,
+            decoder=_decode_jsonb,
+            schema="pg_catalog",
+            format="binary",
+        )
+        if not self.pgbouncer_transaction_mode:
+            # Staging tables live as long as the connection (asyncpg's reset on
+            # release does not discard temp tables)
+            await conn.execute(self._stage_ddl)
+
     async def connect(self) -> None:
-        """Create connection pool and ensure schema exists"""
+        """Ensure database and schema exist, then create the connection pool"""
         try:
-            # Optional admin connection to create database if needed.
-            # This can fail when connecting through PgBouncer configured for a single DB.
+            # The database normally exists: connect straight away and only take the
+            # admin path (extra connection to "postgres") when it is missing
             try:
-                admin_conn = await asyncpg.connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    database="postgres"
-                )
-                
-                db_exists = await admin_conn.fetchval(
-                    "SELECT 1 FROM pg_database WHERE datname = $1",
-                    self.database
-                )
-                if not db_exists:
-                    await admin_conn.execute(
-                        f'CREATE DATABASE "{self.database}"'
-                    )
-                    log.info(f"Created database {self.database}")
-                await admin_conn.close()
-            except Exception as e:
-                log.warning(
-                    "Admin connection skipped (cannot access postgres DB). "
-                    f"Continuing with database={self.database}. Error: {e}"
-                )
+                conn = await self._connect()
+            except asyncpg.InvalidCatalogNameError:
+                await self._create_database()
+                conn = await self._connect()
+            log.info("Connected to PostgreSQL database %s", self.database)
             
-            # Create connection pool to our database
-            self.pool = await asyncpg.create_pool(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                min_size=2,
-                max_size=10
-            )
-            log.info(f"Connected to PostgreSQL database {self.database}")
-            
-            # Ensure schema exists
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
-                log.info(f"Created/verified schema {self.schema}")
+            # Create schema, tables and indexes before the pool opens: pooled
+            # connections create their staging tables LIKE the target tables
+            try:
+                await self._ensure_schema(conn)
+            finally:
+                await conn.close()
             
-            # Create tables
-            await self._ensure_schema()
-            log.info("Schema ensured successfully")
+            self.pool = await self._create_pool()
             
         except Exception as e:
-            log.error(f"ERROR: Failed to connect to PostgreSQL: {str(e)}")
+            log.error("ERROR: Failed to connect to PostgreSQL: %s", e)
             raise
 
-    async def _ensure_schema(self) -> None:
-        """Create all tables in the schema"""
-        async with self.pool.acquire() as conn:
-            # Set search path to our schema
-            await conn.execute(f'SET search_path TO "{self.schema}"')
-            
-            # Create trades table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".trades (
-                    instid VARCHAR(50) NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    tradeid VARCHAR(100) NOT NULL,
-                    px DOUBLE PRECISION NOT NULL,
-                    sz DOUBLE PRECISION NOT NULL,
-                    side VARCHAR(10) NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms, tradeid)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_trades_instid_ts 
-                ON "{self.schema}".trades(instid, ts_event_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.trades")
-            
-            # Create funding_rates table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".funding_rates (
-                    instid VARCHAR(50) NOT NULL,
-                    fundingrate DOUBLE PRECISION NOT NULL,
-                    fundingtime BIGINT NOT NULL,
-                    nextfundingtime BIGINT NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_funding_rates_instid_ts 
-                ON "{self.schema}".funding_rates(instid, ts_event_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.funding_rates")
-            
-            # Create mark_prices table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".mark_prices (
-                    instid VARCHAR(50) NOT NULL,
-                    markpx DOUBLE PRECISION NOT NULL,
-                    idxpx DOUBLE PRECISION NOT NULL,
-                    idxts BIGINT NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_mark_prices_instid_ts 
-                ON "{self.schema}".mark_prices(instid, ts_event_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.mark_prices")
-            
-            # Create tickers table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".tickers (
-                    instid VARCHAR(50) NOT NULL,
-                    last DOUBLE PRECISION,
-                    lastsz DOUBLE PRECISION,
-                    bidpx DOUBLE PRECISION,
-                    bidsz DOUBLE PRECISION,
-                    askpx DOUBLE PRECISION,
-                    asksz DOUBLE PRECISION,
-                    open24h DOUBLE PRECISION,
-                    high24h DOUBLE PRECISION,
-                    low24h DOUBLE PRECISION,
-                    vol24h DOUBLE PRECISION,
-                    volccy24h DOUBLE PRECISION,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_tickers_instid_ts 
-                ON "{self.schema}".tickers(instid, ts_event_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.tickers")
-            
-            # Create open_interest table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".open_interest (
-                    instid VARCHAR(50) NOT NULL,
-                    oi DOUBLE PRECISION NOT NULL,
-                    oiccy DOUBLE PRECISION NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms)
-                )
-            """)
+    async def _connect(self) -> asyncpg.Connection:
+        return await asyncpg.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            statement_cache_size=self.statement_cache_size,
+        )
+
+    async def _create_pool(self) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            min_size=self.pool_min_size,
+            max_size=self.pool_max_size,
+            # Per-connection prepared statement cache; INSERT SQL is prebuilt once,
+            # so each statement is parsed and planned once per connection
+            statement_cache_size=self.statement_cache_size,
+            init=self._init_connection,
+        )
+
+    async def _create_database(self) -> None:
+        """Create the target database through an admin connection to the postgres DB"""
+        admin_conn = await asyncpg.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database="postgres"
+        )
+        try:
+            await admin_conn.execute(f'CREATE DATABASE "{self.database}"')
+            log.info("Created database %s", self.database)
+        except asyncpg.DuplicateDatabaseError:
+            # Created concurrently by another collector instance
+            pass
+        finally:
+            await admin_conn.close()
+
+    async def _ensure_schema(self, conn: asyncpg.Connection) -> None:
+        """Create the schema, all tables and indexes"""
+        # No arguments: asyncpg sends the whole script as one simple query
+        await conn.execute(_SCHEMA_DDL.format(schema=self.schema))
+        
+        # Migrate oiccy column type if needed (from VARCHAR to DOUBLE PRECISION).
+        # Check the catalog first: ALTER ... TYPE ... USING rewrites the whole table
+        # under an ACCESS EXCLUSIVE lock even when the type is already correct.
+        oiccy_type = await conn.fetchval(
+            """
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = $1 AND table_name = 'open_interest' AND column_name = 'oiccy'
+            """,
+            self.schema,
+        )
+        if oiccy_type is not None and oiccy_type != "double precision":
             await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_open_interest_instid_ts 
-                ON "{self.schema}".open_interest(instid, ts_event_ms)
+                ALTER TABLE "{self.schema}".open_interest 
+                ALTER COLUMN oiccy TYPE DOUBLE PRECISION 
+                USING oiccy::double precision
             """)
-            log.info(f"Created/verified table {self.schema}.open_interest")
-            
-            # Migrate oiccy column type if needed (from VARCHAR to DOUBLE PRECISION)
+            log.info("Migrated oiccy column from %s to DOUBLE PRECISION", oiccy_type)
+        log.info("Schema ensured: %s (tables and indexes created/verified)", self.schema)
+
+    async def _insert_rows(self, table: str, rows: List[Tuple[Any, ...]]) -> None:
+        """Insert rows in chunks of insert_batch_size, bounded by insert_concurrency"""
+        step = self.insert_batch_size
+        self._pending_inserts += 1
+        self._inserts_idle.clear()
+        try:
+            async with self._insert_sem:
+                db_inserts_in_flight.inc()
+                try:
+                    for start in range(0, len(rows), step):
+                        chunk = rows[start:start + step]
+                        await self._insert_chunk_with_retry(table, chunk)
+                        db_insert_batch_rows.labels(table=table).observe(len(chunk))
+                finally:
+                    db_inserts_in_flight.dec()
+        finally:
+            self._pending_inserts -= 1
+            if not self._pending_inserts:
+                self._inserts_idle.set()
+
+    async def _insert_chunk_with_retry(self, table: str, chunk: List[Tuple[Any, ...]]) -> None:
+        """Run one chunk, retrying transient connection errors with exponential backoff"""
+        for attempt in range(INSERT_RETRY_ATTEMPTS):
             try:
-                await conn.execute(f"""
-                    ALTER TABLE "{self.schema}".open_interest 
-                    ALTER COLUMN oiccy TYPE DOUBLE PRECISION 
-                    USING oiccy::double precision
-                """)
-                log.info(f"Migrated oiccy column to DOUBLE PRECISION")
-            except Exception as e:
-                # Column might already be correct type or table doesn't exist yet
-                if "does not exist" not in str(e) and "already" not in str(e).lower():
-                    log.debug(f"Could not migrate oiccy column (might already be correct): {e}")
-            
-            # Create orderbook_snapshots table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".orderbook_snapshots (
-                    snapshot_id UUID NOT NULL,
-                    instid VARCHAR(50) NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    side SMALLINT NOT NULL,
-                    price DOUBLE PRECISION NOT NULL,
-                    size DOUBLE PRECISION NOT NULL,
-                    level SMALLINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms, snapshot_id, side, price)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_orderbook_snapshots_instid_ts 
-                ON "{self.schema}".orderbook_snapshots(instid, ts_event_ms)
-            """)
-            # Index for incremental sync watermark
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_orderbook_snapshots_ts_ingest_ms 
-                ON "{self.schema}".orderbook_snapshots(ts_ingest_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.orderbook_snapshots")
-            
-            # Create orderbook_updates table (using JSONB for nested data)
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".orderbook_updates (
-                    instid VARCHAR(50) NOT NULL,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    bids_delta JSONB,
-                    asks_delta JSONB,
-                    checksum BIGINT,
-                    PRIMARY KEY (instid, ts_event_ms)
-                )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_orderbook_updates_instid_ts 
-                ON "{self.schema}".orderbook_updates(instid, ts_event_ms)
-            """)
-            # Index for incremental sync watermark
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_orderbook_updates_ts_ingest_ms 
-                ON "{self.schema}".orderbook_updates(ts_ingest_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.orderbook_updates")
-            
-            # Create index_tickers table
-            await conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{self.schema}".index_tickers (
-                    instid VARCHAR(50) NOT NULL,
-                    idxpx DOUBLE PRECISION NOT NULL,
-                    open24h DOUBLE PRECISION,
-                    high24h DOUBLE PRECISION,
-                    low24h DOUBLE PRECISION,
-                    sodutc0 DOUBLE PRECISION,
-                    sodutc8 DOUBLE PRECISION,
-                    ts_event_ms BIGINT NOT NULL,
-                    ts_ingest_ms BIGINT NOT NULL,
-                    PRIMARY KEY (instid, ts_event_ms)
+                async with self.pool.acquire() as conn:
+                    if table in _COPY_COLUMNS:
+                        await self._copy_chunk(conn, table, chunk)
+                    else:
+                        await conn.executemany(self._insert_sql[table], chunk)
+                return
+            except _RETRYABLE_ERRORS as e:
+                if attempt == INSERT_RETRY_ATTEMPTS - 1:
+                    raise
+                delay = INSERT_RETRY_BASE_DELAY * (2 ** attempt)
+                log.warning(
+                    "PostgreSQL insert retry: table=%s rows=%d attempt=%d sleep_s=%.1f error=%r",
+                    table, len(chunk), attempt + 1, delay, e,
                 )
-            """)
-            await conn.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_index_tickers_instid_ts 
-                ON "{self.schema}".index_tickers(instid, ts_event_ms)
-            """)
-            log.info(f"Created/verified table {self.schema}.index_tickers")
+                await asyncio.sleep(delay)
 
-    async def write_trades(self, batch: Sequence[Dict[str, Any]]) -> None:
-        if not batch:
-            return
+    async def _copy_chunk(
+        self, conn: asyncpg.Connection, table: str, chunk: List[Tuple[Any, ...]]
+    ) -> None:
+        """
+        Binary COPY into the connection's staging table, then move the rows
+        into the target with INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+        COPY itself cannot skip duplicates, the staging step keeps inserts idempotent.
+        """
+        create_sql, merge_sql = self._copy_sql[table]
         try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".trades 
-                    (instid, ts_event_ms, tradeid, px, sz, side, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7)
-                    ON CONFLICT (instid, ts_event_ms, tradeid) DO NOTHING
-                    """,
-                    [
-                        (
-                            trade["instId"],
-                            trade["ts_event_ms"],
-                            trade["tradeId"],
-                            trade["px"],
-                            trade["sz"],
-                            trade["side"],
-                            trade["ts_ingest_ms"],
-                        )
-                        for trade in batch
-                    ],
+            async with conn.transaction():
+                if create_sql is not None:
+                    await conn.execute(create_sql)
+                await conn.copy_records_to_table(
+                    f"_stage_{table}", records=chunk, columns=_COPY_COLUMNS[table]
                 )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing trades: {str(e)}")
+                await conn.execute(merge_sql)
+        except asyncpg.exceptions.UndefinedTableError:
+            if create_sql is not None:
+                raise
+            # The session staging table is gone: PgBouncer in transaction mode ran
+            # this transaction on another server connection. Switch to
+            # per-transaction staging for good instead of dropping the batch.
+            log.warning(
+                "staging table _stage_%s is missing on this connection, "
+                "switching to per-transaction staging (PgBouncer transaction mode?)",
+                table,
+            )
+            self.pgbouncer_transaction_mode = True
+            self._copy_sql = self._build_copy_sql()
+            await self._copy_chunk(conn, table, chunk)
 
-    async def write_funding_rates(self, batch: Sequence[Dict[str, Any]]) -> None:
+    async def _write(
+        self,
+        table: str,
+        to_row: Callable[[Dict[str, Any]], Tuple[Any, ...]],
+        batch: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Shared write path: build parameter tuples and insert them into table"""
         if not batch:
             return
         try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".funding_rates 
-                    (instid, fundingrate, fundingtime, nextfundingtime, ts_event_ms, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            rate["instId"],
-                            rate["fundingRate"],
-                            rate["fundingTime"],
-                            rate["nextFundingTime"],
-                            rate["ts_event_ms"],
-                            rate["ts_ingest_ms"],
-                        )
-                        for rate in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing funding_rates: {str(e)}")
+            await self._insert_rows(table, list(map(to_row, batch)))
+        except Exception:
+            log.exception("PostgreSQL insert error: table=%s rows=%d", table, len(batch))
+            raise
+
+    async def write_trades(self, batch: Sequence[Dict[str, Any]]) -> None:
+        await self._write("trades", _TRADE_ROW, batch)
+
+    async def write_funding_rates(self, batch: Sequence[Dict[str, Any]]) -> None:
+        await self._write("funding_rates", _FUNDING_RATE_ROW, batch)
 
     async def write_mark_prices(self, batch: Sequence[Dict[str, Any]]) -> None:
-        if not batch:
-            return
-        try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".mark_prices 
-                    (instid, markpx, idxpx, idxts, ts_event_ms, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            price["instId"],
-                            price["markPx"],
-                            price["idxPx"],
-                            price["idxTs"],
-                            price["ts_event_ms"],
-                            price["ts_ingest_ms"],
-                        )
-                        for price in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing mark_prices: {str(e)}")
+        await self._write("mark_prices", _MARK_PRICE_ROW, batch)
 
     async def write_tickers(self, batch: Sequence[Dict[str, Any]]) -> None:
-        if not batch:
-            return
-        try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".tickers 
-                    (instid, last, lastsz, bidpx, bidsz, askpx, asksz, 
-                     open24h, high24h, low24h, vol24h, volccy24h, ts_event_ms, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            ticker["instId"],
-                            ticker["last"],
-                            ticker["lastSz"],
-                            ticker["bidPx"],
-                            ticker["bidSz"],
-                            ticker["askPx"],
-                            ticker["askSz"],
-                            ticker["open24h"],
-                            ticker["high24h"],
-                            ticker["low24h"],
-                            ticker["vol24h"],
-                            ticker["volCcy24h"],
-                            ticker["ts_event_ms"],
-                            ticker["ts_ingest_ms"],
-                        )
-                        for ticker in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing tickers: {str(e)}")
+        await self._write("tickers", _TICKER_ROW, batch)
 
     async def write_open_interest(self, batch: Sequence[Dict[str, Any]]) -> None:
-        if not batch:
-            return
-        try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".open_interest 
-                    (instid, oi, oiccy, ts_event_ms, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            oi["instId"],
-                            oi["oi"],
-                            oi["oiCcy"],
-                            oi["ts_event_ms"],
-                            oi["ts_ingest_ms"],
-                        )
-                        for oi in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing open_interest: {str(e)}")
+        await self._write("open_interest", _OPEN_INTEREST_ROW, batch)
 
     async def write_orderbook_snapshots(self, batch: Sequence[Dict[str, Any]]) -> None:
         """
@@ -430,114 +633,22 @@ class PostgreSQLStorage(IStorage):
         Format: {snapshot_id (UUID), instId, ts_event_ms, ts_ingest_ms, side (1=bid, 2=ask), 
         price (Float64), size (Float64), level (UInt16)}
         """
-        from okx_hft.utils.logging import get_logger
-        log = get_logger(__name__)
-        
-        if not batch:
-            return
-        
-        try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".orderbook_snapshots 
-                    (snapshot_id, instid, ts_event_ms, ts_ingest_ms, side, price, size, level)
-                    VALUES ($1::uuid, $2, $3, $4, $5, $6, $7, $8)
-                    ON CONFLICT (instid, ts_event_ms, snapshot_id, side, price) DO NOTHING
-                    """,
-                    [
-                        (
-                            row["snapshot_id"],
-                            row["instId"],
-                            row["ts_event_ms"],
-                            row["ts_ingest_ms"],
-                            row["side"],
-                            row["price"],
-                            row["size"],
-                            row["level"],
-                        )
-                        for row in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(
-                f"PostgreSQL insert error for orderbook_snapshots: {str(e)}"
-            )
-            raise Exception(
-                f"PostgreSQL error writing orderbook_snapshots: {str(e)}"
-            )
+        await self._write("orderbook_snapshots", _ORDERBOOK_SNAPSHOT_ROW, batch)
 
     async def write_index_tickers(self, batch: Sequence[Dict[str, Any]]) -> None:
-        if not batch:
-            return
-        try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".index_tickers 
-                    (instid, idxpx, open24h, high24h, low24h, sodutc0, sodutc8, ts_event_ms, ts_ingest_ms)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            ticker["instId"],
-                            ticker["idxPx"],
-                            ticker["open24h"],
-                            ticker["high24h"],
-                            ticker["low24h"],
-                            ticker["sodUtc0"],
-                            ticker["sodUtc8"],
-                            ticker["ts_event_ms"],
-                            ticker["ts_ingest_ms"],
-                        )
-                        for ticker in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error: {str(e)}")
-            raise Exception(f"PostgreSQL error writing index_tickers: {str(e)}")
+        await self._write("index_tickers", _INDEX_TICKER_ROW, batch)
 
     async def write_orderbook_updates(self, batch: Sequence[Dict[str, Any]]) -> None:
         """Write orderbook updates using JSONB for nested types"""
-        if not batch:
-            return
-        try:
-            import orjson
-            
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'SET search_path TO "{self.schema}"')
-                await conn.executemany(
-                    f"""
-                    INSERT INTO "{self.schema}".orderbook_updates 
-                    (instid, ts_event_ms, ts_ingest_ms, bids_delta, asks_delta, checksum)
-                    VALUES ($1, $2, $3, $4::jsonb, $5::jsonb, $6)
-                    ON CONFLICT (instid, ts_event_ms) DO NOTHING
-                    """,
-                    [
-                        (
-                            update["instId"],
-                            update["ts_event_ms"],
-                            update["ts_ingest_ms"],
-                            orjson.dumps(update.get("bids_delta", [])).decode('utf-8'),
-                            orjson.dumps(update.get("asks_delta", [])).decode('utf-8'),
-                            update.get("checksum", 0),
-                        )
-                        for update in batch
-                    ],
-                )
-        except Exception as e:
-            log.error(f"PostgreSQL insert error for orderbook_updates: {str(e)}")
-            raise Exception(f"PostgreSQL error writing orderbook_updates: {str(e)}")
+        await self._write("orderbook_updates", _orderbook_update_row, batch)
 
     async def flush(self) -> None:
-        """No-op for PostgreSQL (data is written immediately)"""
-        pass
+        """Wait for in-flight inserts to complete (rows are not buffered here)"""
+        await self._inserts_idle.wait()
 
     async def close(self) -> None:
-        """Close connection pool"""
+        """Wait for in-flight inserts, then close connection pool"""
+        await self.flush()
         if self.pool:
             await self.pool.close()
             log.info("PostgreSQL connection pool closed")
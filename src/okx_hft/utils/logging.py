@@ -1,25 +1,55 @@
 
-import logging, sys, json, time, os
+import logging, sys, os, copy, queue, threading, atexit
+from logging.handlers import QueueHandler, QueueListener
+import orjson
 from typing import Any, Dict
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
         payload: Dict[str, Any] = {
             "level": record.levelname,
-            "ts": int(time.time() * 1000),
+            # record.created is stamped when the record is made: no extra clock call,
+            # and still correct if formatting happens later on another thread
+            "ts": int(record.created * 1000),
             "logger": record.name,
-            "message": record.getMessage(),
+            "message": record.getMessage() if record.args else str(record.msg),
         }
         if record.exc_info:
             payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+        return orjson.dumps(payload).decode()
+
+class _RecordQueueHandler(QueueHandler):
+    """Enqueue records as-is for JsonFormatter on the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render args now (they may be mutated after the call), but keep exc_info:
+        # the default prepare() would fold the traceback into the message text
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# Formatting and the stdout write run on a listener thread, off the event loop
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+
+def _ensure_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            h = logging.StreamHandler(sys.stdout)
+            h.setFormatter(JsonFormatter())
+            _listener = QueueListener(_log_queue, h)
+            _listener.start()
+            # Drain queued records on interpreter exit
+            atexit.register(_listener.stop)
 
 def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
-        h = logging.StreamHandler(sys.stdout)
-        h.setFormatter(JsonFormatter())
-        logger.addHandler(h)
+        _ensure_listener()
+        logger.addHandler(_RecordQueueHandler(_log_queue))
         level = os.getenv("LOG_LEVEL","INFO").upper()
         logger.setLevel(level)
     return logger
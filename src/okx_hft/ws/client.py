@@ -1,12 +1,13 @@
 
 import asyncio
+import math
 import aiohttp
 import orjson
 import random
 from typing import Dict, Any
 from okx_hft.config.settings import Settings
 from okx_hft.utils.logging import get_logger
-from okx_hft.metrics.server import reconnects_total, events_total
+from okx_hft.metrics.server import reconnects_total, events_batched
 from okx_hft.storage.postgres import PostgreSQLStorage
 from okx_hft.handlers.trades import TradesHandler
 from okx_hft.handlers.orderbook import OrderBookHandler
@@ -19,15 +20,18 @@ from okx_hft.handlers.index_tickers import IndexTickersHandler
 log = get_logger(__name__)
 
 
-def full_jitter_delay(base: float, cap: float, attempt: int) -> float:
-    exp = min(cap, base * (2 ** attempt))
-    return random.uniform(0, exp)
+def backoff_schedule(base: float, cap: float, steps: int = 32) -> tuple[float, ...]:
+    """Верхние границы задержки по номеру попытки: min(cap, base * 2^attempt)"""
+    return tuple(min(cap, base * (1 << attempt)) for attempt in range(steps))
 
 
 class OKXWebSocketClient:
     def __init__(self, settings: Settings) -> None:
         self.s = settings
         self._attempt = 0
+        # Подписка не меняется между переподключениями: сериализуется один раз в run_forever
+        self._sub_payload_str = ""
+        self._session: aiohttp.ClientSession | None = None
         
         # PostgreSQL storage will be initialized in run_forever (async)
         self.storage = None
@@ -49,6 +53,18 @@ class OKXWebSocketClient:
         self.open_interest_handler = OpenInterestHandler(self.storage)
         self.index_tickers_handler = IndexTickersHandler(self.storage)
 
+        # Таблица маршрутизации канал -> обработчик, строится один раз
+        self._routes = {
+            "trades": self.trades_handler.on_trade,
+            "funding-rate": self.funding_rate_handler.on_funding_rate,
+            "mark-price": self.mark_price_handler.on_mark_price,
+            "tickers": self.tickers_handler.on_ticker,
+            "open-interest": self.open_interest_handler.on_open_interest,
+            "index-tickers": self.index_tickers_handler.on_index_ticker,
+        }
+        for books_channel in ("books", "books-l2-tbt", "books50-l2-tbt", "books5"):
+            self._routes[books_channel] = self._route_books
+
     def _sub_payload(self) -> Dict[str, Any]:
         # Regular channels use INSTRUMENTS (e.g., BTC-USDT-SWAP)
         args = [
@@ -74,6 +90,13 @@ class OKXWebSocketClient:
                 password=self.s.POSTGRES_PASSWORD,
                 database=self.s.POSTGRES_DB,
                 schema=self.s.POSTGRES_SCHEMA,
+                insert_batch_size=self.s.INSERT_BATCH_SIZE,
+                insert_concurrency=self.s.INSERT_CONCURRENCY,
+                pool_min_size=self.s.POSTGRES_POOL_MIN_SIZE,
+                pool_max_size=self.s.POSTGRES_POOL_MAX_SIZE,
+                statement_cache_size=self.s.POSTGRES_STATEMENT_CACHE_SIZE,
+                pgbouncer_transaction_mode=self.s.POSTGRES_PGBOUNCER_TRANSACTION_MODE,
+                synchronous_commit=self.s.POSTGRES_SYNCHRONOUS_COMMIT,
             )
             await self.storage.connect()
             log.info("PostgreSQL storage initialized successfully")
@@ -102,82 +125,107 @@ class OKXWebSocketClient:
                 exc_info=True
             )
         
-        while True:
-            try:
-                await self._run_once()
-                self._attempt = 0
-            except Exception as e:  # transport/protocol fallback; classify further in future
-                reconnects_total.inc()
-                # Generate snapshots before reconnect
+        self._sub_payload_str = orjson.dumps(self._sub_payload()).decode()
+        backoff = backoff_schedule(self.s.BACKOFF_BASE, self.s.BACKOFF_CAP)
+        last_step = len(backoff) - 1
+        
+        # Одна сессия на все переподключения: коннектор, DNS-кэш и SSL-контекст
+        # не пересоздаются при каждом обрыве
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ttl_dns_cache=300)
+        )
+        try:
+            while True:
                 try:
-                    await self.orderbook_handler.on_reconnect()
-                except Exception as reconnect_err:
+                    await self._run_once()
+                    self._attempt = 0
+                except Exception as e:  # transport/protocol fallback; classify further in future
+                    reconnects_total.inc()
+                    # Generate snapshots before reconnect
+                    try:
+                        await self.orderbook_handler.on_reconnect()
+                    except Exception as reconnect_err:
+                        log.error(
+                            f"Error generating snapshots on reconnect: {reconnect_err}"
+                        )
+                
+                    self._attempt += 1
+                    # Full jitter: равномерно в [0, backoff[attempt])
+                    delay = random.random() * backoff[min(self._attempt, last_step)]
                     log.error(
-                        f"Error generating snapshots on reconnect: {reconnect_err}"
+                        f"ws_error_reconnect: {str(e)}, attempt={self._attempt}, "
+                        f"sleep_s={delay}"
                     )
-                
-                self._attempt += 1
-                delay = full_jitter_delay(
-                    self.s.BACKOFF_BASE, self.s.BACKOFF_CAP, self._attempt
-                )
-                log.error(
-                    f"ws_error_reconnect: {str(e)}, attempt={self._attempt}, "
-                    f"sleep_s={delay}"
-                )
-                await asyncio.sleep(delay)
+                    await asyncio.sleep(delay)
+        finally:
+            await self._session.close()
 
     async def _run_once(self) -> None:
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(self.s.OKX_WS_URL, heartbeat=20) as ws:
-                sub_payload = self._sub_payload()
-                await ws.send_json(sub_payload)
-                log.info(f"Sent subscription: {sub_payload}")
-                
-                async for msg in ws:
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        data = orjson.loads(msg.data)
-                        
-                        # Логируем ответы от сервера на подписку и ошибки
-                        if data.get("event") or data.get("code") or "arg" not in data:
-                            log.info(f"Server response: {data}")
-                        
-                        await self._on_message(data)
-                    elif msg.type == aiohttp.WSMsgType.ERROR:
-                        raise RuntimeError("WS error")
+        # compress=0: без permessage-deflate, сообщения OKX небольшие и распаковка
+        # каждого кадра стоит больше, чем экономия трафика
+        async with self._session.ws_connect(
+            self.s.OKX_WS_URL, heartbeat=20, compress=0
+        ) as ws:
+            await ws.send_str(self._sub_payload_str)
+            log.info("Sent subscription: %s", self._sub_payload_str)
+            
+            # Локальные ссылки для горячего цикла: без поиска атрибутов на каждый кадр
+            TEXT = aiohttp.WSMsgType.TEXT
+            ERROR = aiohttp.WSMsgType.ERROR
+            CLOSING_TYPES = (
+                aiohttp.WSMsgType.CLOSE,
+                aiohttp.WSMsgType.CLOSING,
+                aiohttp.WSMsgType.CLOSED,
+            )
+            loads = orjson.loads
+            on_message = self._on_message
+            receive = ws.receive
+            
+            # receive() напрямую вместо async for: без обёртки __anext__ на каждый кадр
+            while True:
+                msg = await receive()
+                msg_type = msg.type
+                if msg_type == TEXT:
+                    data = loads(msg.data)
+                    
+                    # Логируем ответы от сервера на подписку и ошибки
+                    # (у push-сообщений с данными есть arg и нет event/code)
+                    if "arg" not in data or "event" in data or "code" in data:
+                        log.info("Server response: %s", data)
+                    
+                    await on_message(data)
+                elif msg_type == ERROR:
+                    raise RuntimeError("WS error")
+                elif msg_type in CLOSING_TYPES:
+                    break
 
     async def _on_message(self, data: Dict[str, Any]) -> None:
-        arg = data.get("arg", {})
-        channel = arg.get("channel", "unknown")
-        inst = arg.get("instId", "unknown")
+        # У push-сообщений arg/channel/instId есть всегда; без них это ответ
+        # сервера (event/error), он уже залогирован в _run_once
+        try:
+            arg = data["arg"]
+            channel = arg["channel"]
+            inst = arg["instId"]
+        except KeyError:
+            return
         
-        if channel and inst:
-            events_total.labels(channel=channel, instId=inst).inc()
-            
-            # Маршрутизация сообщений по каналам
-            if channel == "trades":
-                await self.trades_handler.on_trade(data)
-            elif channel in ("books", "books-l2-tbt", "books50-l2-tbt", "books5"):
-                action = data.get("action", "snapshot")
-                # Проверяем тип сообщения: snapshot или update
-                if action == "snapshot":
-                    await self.orderbook_handler.on_snapshot(data)
-                elif action == "update":
-                    await self.orderbook_handler.on_increment(data)
-                else:
-                    # Если action не указан, считаем snapshot
-                    await self.orderbook_handler.on_snapshot(data)
-            elif channel == "funding-rate":
-                await self.funding_rate_handler.on_funding_rate(data)
-            elif channel == "mark-price":
-                await self.mark_price_handler.on_mark_price(data)
-            elif channel == "tickers":
-                await self.tickers_handler.on_ticker(data)
-            elif channel == "open-interest":
-                await self.open_interest_handler.on_open_interest(data)
-            elif channel == "index-tickers":
-                await self.index_tickers_handler.on_index_ticker(data)
-            else:
-                log.warning(f"Unknown channel: {channel}")
+        events_batched.inc((channel, inst))
+        
+        # Маршрутизация сообщений по каналам
+        route = self._routes.get(channel)
+        if route is not None:
+            await route(data)
+        else:
+            log.warning(f"Unknown channel: {channel}")
+
+    async def _route_books(self, data: Dict[str, Any]) -> None:
+        action = data.get("action", "snapshot")
+        # Проверяем тип сообщения: snapshot или update
+        if action == "update":
+            await self.orderbook_handler.on_increment(data)
+        else:
+            # snapshot, а также сообщения без известного action
+            await self.orderbook_handler.on_snapshot(data)
 
     async def _resubscribe_orderbook(self, inst_id: str) -> None:
         """Resubscribe to orderbook for specific instrument (called on checksum mismatch)"""
@@ -193,6 +241,8 @@ class OKXWebSocketClient:
         
         Метод идемпотентен - повторные вызовы безопасны.
         Каждый handler.flush() ничего не делает, если батч пуст.
+        Обработчики сбрасываются параллельно: время сброса равно самой
+        долгой записи, а не их сумме.
         """
         handlers = [
             ("trades", self.trades_handler),
@@ -204,21 +254,33 @@ class OKXWebSocketClient:
             ("index_tickers", self.index_tickers_handler),
         ]
         
-        for name, handler in handlers:
-            try:
-                await handler.flush()
-            except Exception as e:
-                log.error(f"Ошибка при сбросе {name} при остановке: {e}")
+        results = await asyncio.gather(
+            *(handler.flush() for _, handler in handlers),
+            return_exceptions=True,
+        )
+        for (name, _), result in zip(handlers, results):
+            if isinstance(result, Exception):
+                log.error(f"Ошибка при сбросе {name} при остановке: {result}")
 
     async def periodic_flush(self) -> None:
         """Периодическая отправка батчей каждые 5 секунд"""
+        loop = asyncio.get_running_loop()
+        interval = 5.0
+        # Сбросы идут по фиксированной сетке: длительность сброса не сдвигает следующий
+        next_flush = loop.time() + interval
+        in_flight = None
         while True:
             try:
-                await asyncio.sleep(5.0)
-                await self.flush_all_handlers()
+                await asyncio.sleep(max(0.0, next_flush - loop.time()))
+                # shield: отмена не должна прерывать начатые записи - обработчики
+                # уже забрали свои батчи, и прерванная запись потеряла бы их все
+                in_flight = asyncio.ensure_future(self.flush_all_handlers())
+                await asyncio.shield(in_flight)
             except asyncio.CancelledError:
                 log.info("Задача periodic_flush отменена, выполняем финальный сброс...")
                 try:
+                    if in_flight is not None and not in_flight.done():
+                        await in_flight
                     await self.flush_all_handlers()
                     log.info("Финальный сброс выполнен успешно")
                 except Exception as e:
@@ -226,3 +288,9 @@ class OKXWebSocketClient:
                 break
             except Exception as e:
                 log.error(f"Ошибка в periodic flush: {str(e)}")
+            # Следующий тик сетки считаем после сброса: если сброс затянулся
+            # дольше интервала, пропущенные тики отбрасываем, а не запускаем подряд
+            next_flush += interval
+            now = loop.time()
+            if next_flush < now:
+                next_flush += interval * math.ceil((now - next_flush) / interval)
@@ -1,9 +1,10 @@
 import asyncio
-import json
+import math
+import sys
 import time
-from datetime import datetime, timezone
 
-import websockets  # pip install websockets
+import aiohttp
+import orjson
 
 WS_URL = "wss://ws.okx.com:8443/ws/v5/public"
 INST_ID = "BTC-USDT-SWAP"
@@ -57,21 +58,50 @@ CHANNEL_CONFIG = [
     },
 ]
 
+# Шаблон проверочного запроса (печатается для ручного запуска в psql)
+SQL_TEMPLATE = (
+    "SELECT count(*)\n"
+    "FROM {table}\n"
+    "WHERE {inst_col} = '{inst_id}'\n"
+    "  AND {ts_col} >= {first_ts_ms}\n"
+    "  AND {ts_col} <= {last_ts_ms};"
+)
 
-async def count_all_channels(duration_sec: int = DURATION_SEC) -> None:
-    # Статистика по каждому каналу (одна запись на channel)
-    stats = {
-        cfg["channel"]: {
-            "count": 0,
-            "first_ts_ms": None,
-            "last_ts_ms": None,
-        }
-        for cfg in CHANNEL_CONFIG
-    }
 
-    start_wall = time.time()
+def _iso_utc_ms(ts_ms: int) -> str:
+    """Epoch-миллисекунды в ISO-8601 UTC с миллисекундами, без datetime."""
+    sec, ms = divmod(ts_ms, 1000)
+    t = time.gmtime(sec)
+    return "%04d-%02d-%02dT%02d:%02d:%02d.%03dZ" % (
+        t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, ms
+    )
+
+
+class ChanStat:
+    """Накопленная статистика канала: число записей и диапазон ts (мс)."""
+
+    __slots__ = ("count", "first_ts_ms", "last_ts_ms")
 
-    async with websockets.connect(WS_URL, ping_interval=20, ping_timeout=10) as ws:
+    def __init__(self) -> None:
+        self.count = 0
+        self.first_ts_ms = math.inf
+        self.last_ts_ms = -math.inf
+
+
+async def count_all_channels(duration_sec: int = DURATION_SEC) -> None:
+    # Статистика по каждому каналу (одна запись на channel).
+    # Ключи интернируются один раз при построении; имя канала из кадра не
+    # интернируем: sys.intern на каждом кадре дороже, чем сравнение строк в dict
+    stats = {sys.intern(cfg["channel"]): ChanStat() for cfg in CHANNEL_CONFIG}
+
+    # Монотонные часы цикла: NTP-коррекция не сдвинет окно измерения
+    deadline = asyncio.get_running_loop().time() + duration_sec
+
+    # compress=0: без permessage-deflate (как в коллекторе) - больше трафика,
+    # но нет zlib-распаковки на каждом кадре
+    async with aiohttp.ClientSession() as session, session.ws_connect(
+        WS_URL, heartbeat=20, compress=0
+    ) as ws:
         # Подписка сразу на все каналы
         sub_msg = {
             "op": "subscribe",
@@ -80,98 +110,134 @@ async def count_all_channels(duration_sec: int = DURATION_SEC) -> None:
                 for cfg in CHANNEL_CONFIG
             ],
         }
-        await ws.send(json.dumps(sub_msg))
+        await ws.send_str(orjson.dumps(sub_msg).decode())
         print(f"Subscribed for {duration_sec} seconds to channels:")
         for cfg in CHANNEL_CONFIG:
             print(f"  - {cfg['channel']} : {cfg['instId']}")
         print()
 
-        # Счётчик до тех пор, пока не истечёт duration_sec
-        while time.time() - start_wall < duration_sec:
-            msg = await ws.recv()
-            data = json.loads(msg)
-
-            if not isinstance(data, dict):
-                continue
-
-            arg = data.get("arg") or {}
-            channel_name = arg.get("channel")
-            if channel_name not in stats:
-                continue
-            if "data" not in data:
-                continue
-
-            records = data["data"]
-            chan_stats = stats[channel_name]
-            chan_stats["count"] += len(records)
+        # Локальные ссылки для горячего цикла
+        int_ = int
+        loads = orjson.loads
+        receive = ws.receive
+        get_stats = stats.get
+        TEXT = aiohttp.WSMsgType.TEXT
+        STOP_TYPES = (
+            aiohttp.WSMsgType.CLOSE,
+            aiohttp.WSMsgType.CLOSING,
+            aiohttp.WSMsgType.CLOSED,
+            aiohttp.WSMsgType.ERROR,
+        )
 
-            for rec in records:
-                ts_ms = int(rec["ts"])
-                if chan_stats["first_ts_ms"] is None or ts_ms < chan_stats["first_ts_ms"]:
-                    chan_stats["first_ts_ms"] = ts_ms
-                if chan_stats["last_ts_ms"] is None or ts_ms > chan_stats["last_ts_ms"]:
-                    chan_stats["last_ts_ms"] = ts_ms
+        # Окно измерения ограничено одним таймером цикла событий (часы
+        # монотонные): без проверки времени на каждом кадре, и остановка
+        # происходит вовремя, даже если кадры перестали приходить
+        try:
+            async with asyncio.timeout_at(deadline):
+                while True:
+                    msg = await receive()
+                    msg_type = msg.type
+                    if msg_type in STOP_TYPES:
+                        print(f"WebSocket closed early: {msg_type.name}")
+                        break
+                    if msg_type != TEXT:
+                        continue
+                    raw = msg.data
+                    # Служебные кадры (subscribe/error) без "data" отсекаем
+                    # поиском подстроки, не разбирая JSON
+                    if '"data"' not in raw:
+                        continue
+                    data = loads(raw)
+
+                    if not isinstance(data, dict):
+                        continue
+
+                    arg = data.get("arg")
+                    if not arg:
+                        continue
+                    chan_stats = get_stats(arg.get("channel"))
+                    if chan_stats is None:
+                        continue
+                    records = data.get("data")
+                    if not records:
+                        continue
+
+                    n = len(records)
+                    chan_stats.count += n
+
+                    if n == 1:
+                        # Обычный кадр - одна запись: сравниваем напрямую, без
+                        # списка и вызовов min/max
+                        batch_min = batch_max = int_(records[0]["ts"])
+                    else:
+                        # min/max считаем по всему пакету и сливаем в статистику один раз
+                        ts_list = [int_(rec["ts"]) for rec in records]
+                        batch_min = min(ts_list)
+                        batch_max = max(ts_list)
+                    if batch_min < chan_stats.first_ts_ms:
+                        chan_stats.first_ts_ms = batch_min
+                    if batch_max > chan_stats.last_ts_ms:
+                        chan_stats.last_ts_ms = batch_max
+        except TimeoutError:
+            pass
 
     # ----------------------------------------
     # Вывод результата и SQL по всем таблицам
+    # (собираем отчёт целиком и пишем в stdout одним вызовом)
     # ----------------------------------------
-    print("=" * 80)
-    print(f"Wall-clock duration: {duration_sec} seconds\n")
+    out = []
+    append = out.append
+    append("=" * 80 + "\n")
+    append(f"Wall-clock duration: {duration_sec} seconds\n\n")
 
     for cfg in CHANNEL_CONFIG:
         ch = cfg["channel"]
         st = stats[ch]
 
-        print(f"=== Channel: {ch}  |  InstId: {cfg['instId']} ===")
-        print(f"Records received: {st['count']}")
+        append(f"=== Channel: {ch}  |  InstId: {cfg['instId']} ===\n")
+        append(f"Records received: {st.count}\n")
 
-        first_ts_ms = st["first_ts_ms"]
-        last_ts_ms = st["last_ts_ms"]
+        first_ts_ms = st.first_ts_ms
+        last_ts_ms = st.last_ts_ms
 
-        if first_ts_ms is None or last_ts_ms is None:
-            print("No data received for this channel in the interval.\n")
+        if first_ts_ms == math.inf:
+            append("No data received for this channel in the interval.\n\n")
             continue
 
-        first_dt = datetime.fromtimestamp(first_ts_ms / 1000, tz=timezone.utc)
-        last_dt = datetime.fromtimestamp(last_ts_ms / 1000, tz=timezone.utc)
-
-        print(f"First ts (ms) : {first_ts_ms}")
-        print(f"First UTC     : {first_dt.isoformat()}")
-        print(f"Last  ts (ms) : {last_ts_ms}")
-        print(f"Last  UTC     : {last_dt.isoformat()}")
-
-        ts_col = cfg["ts_column"]
-        inst_col = cfg["instid_column"]
-        inst_id = cfg["instId"]
+        append(f"First ts (ms) : {first_ts_ms}\n")
+        append(f"First UTC     : {_iso_utc_ms(first_ts_ms)}\n")
+        append(f"Last  ts (ms) : {last_ts_ms}\n")
+        append(f"Last  UTC     : {_iso_utc_ms(last_ts_ms)}\n")
+
+        sql_params = {
+            "inst_col": cfg["instid_column"],
+            "inst_id": cfg["instId"],
+            "ts_col": cfg["ts_column"],
+            "first_ts_ms": first_ts_ms,
+            "last_ts_ms": last_ts_ms,
+        }
 
         # Основная таблица
-        print("\n-- SQL for main table:")
-        print(
-            f"""
-SELECT count(*)
-FROM {cfg['db_table']}
-WHERE {inst_col} = '{inst_id}'
-  AND {ts_col} >= {first_ts_ms}
-  AND {ts_col} <= {last_ts_ms};
-""".strip()
-        )
+        append("\n-- SQL for main table:\n")
+        append(SQL_TEMPLATE.format(table=cfg["db_table"], **sql_params) + "\n")
 
         # Дополнительные таблицы (например, orderbook_snapshots)
         extra_tables = cfg.get("extra_tables", [])
         for tbl in extra_tables:
-            print("\n-- SQL for extra table:")
-            print(
-                f"""
-SELECT count(*)
-FROM {tbl}
-WHERE {inst_col} = '{inst_id}'
-  AND {ts_col} >= {first_ts_ms}
-  AND {ts_col} <= {last_ts_ms};
-""".strip()
-            )
+            append("\n-- SQL for extra table:\n")
+            append(SQL_TEMPLATE.format(table=tbl, **sql_params) + "\n")
+
+        append("\n" + "-" * 80 + "\n\n")
 
-        print("\n" + "-" * 80 + "\n")
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        uvloop.install()
     asyncio.run(count_all_channels())
@@ -0,0 +1,40 @@
+"""Unit tests for batched Prometheus metric helpers"""
+from prometheus_client import CollectorRegistry, Counter
+
+# Same import path as the collector modules: metrics register in the global
+# Prometheus registry, so importing via src.* would register them twice
+from okx_hft.metrics.server import BatchedCounter
+
+
+def _counter():
+    registry = CollectorRegistry()
+    metric = Counter("test_events", "Test events", ["channel", "instId"], registry=registry)
+    return metric, registry
+
+
+def test_batched_counter_defers_until_flush():
+    """Increments are buffered locally and not visible before flush()"""
+    metric, registry = _counter()
+    batched = BatchedCounter(metric)
+
+    batched.inc(("trades", "BTC-USDT-SWAP"))
+    batched.inc(("trades", "BTC-USDT-SWAP"), 2)
+
+    labels = {"channel": "trades", "instId": "BTC-USDT-SWAP"}
+    assert registry.get_sample_value("test_events_total", labels) is None
+
+    batched.flush()
+    assert registry.get_sample_value("test_events_total", labels) == 3
+
+
+def test_batched_counter_flush_resets_buffer():
+    """A second flush without new increments leaves the metric unchanged"""
+    metric, registry = _counter()
+    batched = BatchedCounter(metric)
+
+    batched.inc(("books", "ETH-USDT-SWAP"))
+    batched.flush()
+    batched.flush()
+
+    labels = {"channel": "books", "instId": "ETH-USDT-SWAP"}
+    assert registry.get_sample_value("test_events_total", labels) == 1
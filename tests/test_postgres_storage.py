@@ -0,0 +1,269 @@
+"""Unit tests for PostgreSQLStorage write path (no database required)"""
+import asyncio
+import pytest
+
+from okx_hft.storage.postgres import PostgreSQLStorage
+
+
+class FakeConnection:
+    """Records statements instead of sending them to PostgreSQL."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.executed = []
+        self.executemany_calls = []
+        self.copy_calls = []
+        self.fetchval_result = None
+        # Raised by the next COPY (e.g. a staging table missing on the connection)
+        self.copy_error = None
+
+    async def execute(self, sql, *args):
+        self.executed.append(sql)
+
+    async def fetchval(self, sql, *args):
+        return self.fetchval_result
+
+    async def set_type_codec(self, *args, **kwargs):
+        pass
+
+    async def executemany(self, sql, rows):
+        await asyncio.sleep(self.delay)
+        self.executemany_calls.append((sql, list(rows)))
+
+    async def copy_records_to_table(self, table_name, *, records, columns):
+        await asyncio.sleep(self.delay)
+        if self.copy_error is not None:
+            error, self.copy_error = self.copy_error, None
+            raise error
+        self.copy_calls.append((table_name, list(records)))
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+
+class FakePool:
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def make_trade(trade_id: str) -> dict:
+    return {
+        "instId": "BTC-USDT-SWAP",
+        "ts_event_ms": 1704067200000,
+        "tradeId": trade_id,
+        "px": 50000.0,
+        "sz": 1.0,
+        "side": "buy",
+        "ts_ingest_ms": 1704067200100,
+    }
+
+
+def make_storage(conn: FakeConnection, **kwargs) -> PostgreSQLStorage:
+    storage = PostgreSQLStorage(**kwargs)
+    storage.pool = FakePool(conn)
+    return storage
+
+
+@pytest.mark.asyncio
+async def test_write_trades_splits_into_insert_batches():
+    """Batches larger than insert_batch_size are sent in several COPY chunks"""
+    conn = FakeConnection()
+    storage = make_storage(conn, insert_batch_size=2)
+
+    await storage.write_trades([make_trade(str(i)) for i in range(5)])
+
+    assert [len(rows) for _, rows in conn.copy_calls] == [2, 2, 1]
+    assert conn.copy_calls[0][0] == "_stage_trades"
+    assert conn.copy_calls[0][1][0] == (
+        "BTC-USDT-SWAP", 1704067200000, "0", 50000.0, 1.0, "buy", 1704067200100
+    )
+
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_in_flight_inserts():
+    """flush() returns only after queued and running inserts have completed"""
+    conn = FakeConnection(delay=0.01)
+    storage = make_storage(conn, insert_concurrency=1)
+
+    tasks = [
+        asyncio.create_task(storage.write_trades([make_trade(str(i))]))
+        for i in range(3)
+    ]
+    await asyncio.sleep(0)
+
+    await storage.flush()
+
+    assert len(conn.copy_calls) == 3
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_transient_connection_error_is_retried(monkeypatch):
+    """A dropped connection is retried instead of losing the batch"""
+    monkeypatch.setattr("okx_hft.storage.postgres.INSERT_RETRY_BASE_DELAY", 0)
+    conn = FakeConnection()
+    storage = make_storage(conn)
+    original = conn.copy_records_to_table
+    failures = [ConnectionResetError("reset by peer")]
+
+    async def flaky_copy(table_name, *, records, columns):
+        if failures:
+            raise failures.pop()
+        await original(table_name, records=records, columns=columns)
+
+    conn.copy_records_to_table = flaky_copy
+
+    await storage.write_trades([make_trade("1")])
+
+    assert len(conn.copy_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_data_error_is_not_retried(monkeypatch):
+    """Invalid row data fails on the first attempt instead of being replayed"""
+    import asyncpg
+
+    monkeypatch.setattr("okx_hft.storage.postgres.INSERT_RETRY_BASE_DELAY", 0)
+    conn = FakeConnection()
+    storage = make_storage(conn)
+    attempts = []
+
+    async def bad_copy(table_name, *, records, columns):
+        attempts.append(table_name)
+        raise asyncpg.exceptions._base.DataError("invalid input for query argument $4")
+
+    conn.copy_records_to_table = bad_copy
+
+    with pytest.raises(asyncpg.exceptions._base.DataError):
+        await storage.write_trades([make_trade("1")])
+
+    assert len(attempts) == 1
+
+
+@pytest.mark.asyncio
+async def test_copy_chunk_is_merged_with_on_conflict():
+    """COPY goes to a staging table and is merged idempotently into the target"""
+    conn = FakeConnection()
+    storage = make_storage(conn, pgbouncer_transaction_mode=False)
+
+    await storage.write_trades([make_trade("1")])
+
+    # The staging table already exists on the connection: COPY, then one merge
+    assert len(conn.executed) == 1
+    merge_sql = conn.executed[0]
+    assert merge_sql.startswith('SET LOCAL synchronous_commit = off; INSERT INTO "okx_raw".trades')
+    assert "FROM _stage_trades" in merge_sql
+    assert merge_sql.endswith("ON CONFLICT (instid, ts_event_ms, tradeid) DO NOTHING")
+
+
+@pytest.mark.asyncio
+async def test_staging_tables_are_per_connection_unless_pgbouncer_transaction_mode():
+    """Session mode creates staging tables once in init; transaction mode per chunk"""
+    conn = FakeConnection()
+    storage = make_storage(conn, pgbouncer_transaction_mode=False)
+
+    await storage._init_connection(conn)
+
+    assert len(conn.executed) == 1
+    assert "CREATE TEMP TABLE IF NOT EXISTS _stage_trades" in conn.executed[0]
+    assert "ON COMMIT DELETE ROWS" in conn.executed[0]
+
+    # Per-chunk staging is the default: the default endpoint is PgBouncer
+    conn = FakeConnection()
+    storage = make_storage(conn)
+
+    await storage._init_connection(conn)
+    await storage.write_trades([make_trade("1")])
+
+    assert conn.executed[0].startswith("CREATE TEMP TABLE _stage_trades")
+    assert conn.executed[0].endswith("ON COMMIT DROP")
+    assert "FROM _stage_trades" in conn.executed[1]
+
+
+@pytest.mark.asyncio
+async def test_missing_session_staging_table_falls_back_to_per_chunk():
+    """Session mode behind transaction pooling: the chunk is rewritten, not dropped"""
+    import asyncpg
+
+    conn = FakeConnection()
+    conn.copy_error = asyncpg.exceptions.UndefinedTableError(
+        'relation "_stage_trades" does not exist'
+    )
+    storage = make_storage(conn, pgbouncer_transaction_mode=False)
+
+    await storage.write_trades([make_trade("1")])
+
+    assert storage.pgbouncer_transaction_mode is True
+    assert len(conn.copy_calls) == 1
+    assert conn.executed[0].startswith("CREATE TEMP TABLE _stage_trades")
+    assert "FROM _stage_trades" in conn.executed[1]
+
+
+@pytest.mark.asyncio
+async def test_orderbook_updates_pass_deltas_for_binary_jsonb():
+    """Deltas go to asyncpg as Python objects; the jsonb codec adds the version byte"""
+    from okx_hft.storage.postgres import _decode_jsonb, _encode_jsonb
+
+    conn = FakeConnection()
+    storage = make_storage(conn)
+    bids = [[50000.0, 1.5]]
+
+    await storage.write_orderbook_updates([{
+        "instId": "BTC-USDT-SWAP",
+        "ts_event_ms": 1704067200000,
+        "ts_ingest_ms": 1704067200100,
+        "bids_delta": bids,
+        "checksum": 123,
+    }])
+
+    _, rows = conn.executemany_calls[0]
+    assert rows[0][3:] == (bids, [], 123)
+    encoded = _encode_jsonb(bids)
+    assert encoded[:1] == b"\x01"
+    assert _decode_jsonb(encoded) == bids
+
+
+@pytest.mark.asyncio
+async def test_ensure_schema_is_one_script_and_skips_done_migration():
+    """All DDL goes in one execute; the oiccy ALTER runs only for a non-double column"""
+    conn = FakeConnection()
+    conn.fetchval_result = "double precision"
+    storage = make_storage(conn)
+
+    await storage._ensure_schema(conn)
+
+    assert len(conn.executed) == 1
+    assert 'CREATE TABLE IF NOT EXISTS "okx_raw".trades' in conn.executed[0]
+
+    conn.executed.clear()
+    conn.fetchval_result = "character varying"
+    await storage._ensure_schema(conn)
+
+    assert "ALTER COLUMN oiccy TYPE DOUBLE PRECISION" in conn.executed[-1]
+
+
+def test_pool_min_size_defaults_to_insert_concurrency():
+    """Only the connections inserts can hold at once are opened up front"""
+    assert PostgreSQLStorage(insert_concurrency=4, pool_max_size=10).pool_min_size == 4
+    # Concurrency is capped by the pool, and so is the minimum
+    assert PostgreSQLStorage(insert_concurrency=16, pool_max_size=8).pool_min_size == 8
+    assert PostgreSQLStorage(pool_min_size=6, insert_concurrency=4).pool_min_size == 6
@@ -0,0 +1,50 @@
+"""Unit tests for sharding helpers in okx_hft.run"""
+# Same import path as the collector modules: metrics register in the global
+# Prometheus registry, so importing via src.* would register them twice
+from okx_hft.config.settings import Settings
+from okx_hft.run import shard_count, shard_settings
+
+INSTRUMENTS = ["BTC-USDT-SWAP", "ETH-USDT-SWAP", "SOL-USDT-SWAP", "XRP-USDT-SWAP", "DOGE-USDT-SWAP"]
+INDEX_INSTRUMENTS = ["BTC-USDT", "ETH-USDT", "SOL-USDT", "XRP-USDT", "DOGE-USDT"]
+
+
+def make_settings(**overrides) -> Settings:
+    values = {
+        "INSTRUMENTS": INSTRUMENTS,
+        "INDEX_INSTRUMENTS": INDEX_INSTRUMENTS,
+        "METRICS_PORT": 9108,
+        "WS_SHARDS": 1,
+    }
+    values.update(overrides)
+    return Settings(**values)
+
+
+def test_shard_settings_slices_instruments_round_robin():
+    """Shard N takes every shards-th instrument starting at N; together they cover all"""
+    settings = make_settings()
+
+    shards = [shard_settings(settings, shard, 2) for shard in range(2)]
+
+    assert shards[0].INSTRUMENTS == ["BTC-USDT-SWAP", "SOL-USDT-SWAP", "DOGE-USDT-SWAP"]
+    assert shards[1].INSTRUMENTS == ["ETH-USDT-SWAP", "XRP-USDT-SWAP"]
+    assert shards[1].INDEX_INSTRUMENTS == ["ETH-USDT", "XRP-USDT"]
+    assert sorted(shards[0].INSTRUMENTS + shards[1].INSTRUMENTS) == sorted(INSTRUMENTS)
+    # The original settings are not modified
+    assert settings.INSTRUMENTS == INSTRUMENTS
+
+
+def test_shard_settings_offsets_metrics_port():
+    """Each shard serves metrics on METRICS_PORT + shard"""
+    settings = make_settings()
+
+    ports = [shard_settings(settings, shard, 3).METRICS_PORT for shard in range(3)]
+
+    assert ports == [9108, 9109, 9110]
+
+
+def test_shard_count_is_capped_by_instruments():
+    """No more shards than instruments, and never fewer than one"""
+    assert shard_count(make_settings(WS_SHARDS=3)) == 3
+    assert shard_count(make_settings(WS_SHARDS=8)) == len(INSTRUMENTS)
+    assert shard_count(make_settings(WS_SHARDS=0)) == 1
+    assert shard_count(make_settings(WS_SHARDS=2, INSTRUMENTS=[])) == 1
@@ -12,14 +12,58 @@ from src.okx_hft.handlers.funding_rate import FundingRateHandler
 from src.okx_hft.handlers.orderbook import OrderBookHandler
 
 
+class RecordingStorage:
+    """Лёгкая замена AsyncMock: записывает вызовы write_* в список calls."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def written(self, name):
+        """Батчи, переданные в write_<name>, в порядке вызовов."""
+        return [batch for called, batch in self.calls if called == name]
+
+    async def _record(self, name, batch):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.calls.append((name, batch))
+
+    async def write_trades(self, batch):
+        await self._record("trades", batch)
+
+    async def write_funding_rates(self, batch):
+        await self._record("funding_rates", batch)
+
+    async def write_mark_prices(self, batch):
+        await self._record("mark_prices", batch)
+
+    async def write_tickers(self, batch):
+        await self._record("tickers", batch)
+
+    async def write_open_interest(self, batch):
+        await self._record("open_interest", batch)
+
+    async def write_index_tickers(self, batch):
+        await self._record("index_tickers", batch)
+
+    async def write_orderbook_snapshots(self, batch):
+        await self._record("orderbook_snapshots", batch)
+
+    async def write_orderbook_updates(self, batch):
+        await self._record("orderbook_updates", batch)
+
+    async def flush(self):
+        pass
+
+
 class TestTradesHandlerFlush:
     """Тесты для поведения TradesHandler.flush()."""
 
     @pytest.mark.asyncio
     async def test_flush_empty_batch_does_nothing(self):
         """Проверяем, что flush() с пустым батчем ничего не делает."""
-        mock_storage = AsyncMock()
-        handler = TradesHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = TradesHandler(storage=storage)
         
         # Батч пуст
         assert len(handler.batch) == 0
@@ -27,13 +71,13 @@ class TestTradesHandlerFlush:
         await handler.flush()
         
         # Storage не должен быть вызван
-        mock_storage.write_trades.assert_not_called()
+        assert storage.calls == []
 
     @pytest.mark.asyncio
     async def test_flush_with_data_writes_to_storage(self):
         """Проверяем, что flush() записывает батч в хранилище и очищает его."""
-        mock_storage = AsyncMock()
-        handler = TradesHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = TradesHandler(storage=storage)
         
         # Добавляем трейды в батч
         trades = [
@@ -61,7 +105,7 @@ class TestTradesHandlerFlush:
         await handler.flush()
         
         # Storage должен быть вызван с батчем
-        mock_storage.write_trades.assert_called_once_with(trades)
+        assert storage.calls == [("trades", trades)]
         # Батч должен быть очищен
         assert len(handler.batch) == 0
 
@@ -80,18 +124,18 @@ class TestTradesHandlerFlush:
     @pytest.mark.asyncio
     async def test_flush_is_idempotent(self):
         """Проверяем, что многократный вызов flush() безопасен."""
-        mock_storage = AsyncMock()
-        handler = TradesHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = TradesHandler(storage=storage)
         
         handler.batch = [{"test": "data"}]
         
         # Первый flush
         await handler.flush()
-        assert mock_storage.write_trades.call_count == 1
+        assert len(storage.calls) == 1
         
         # Второй flush ничего не должен делать (батч пуст)
         await handler.flush()
-        assert mock_storage.write_trades.call_count == 1
+        assert len(storage.calls) == 1
 
 
 class TestFundingRateHandlerFlush:
@@ -100,24 +144,24 @@ class TestFundingRateHandlerFlush:
     @pytest.mark.asyncio
     async def test_flush_empty_batch_does_nothing(self):
         """Проверяем, что flush() с пустым батчем ничего не делает."""
-        mock_storage = AsyncMock()
-        handler = FundingRateHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = FundingRateHandler(storage=storage)
         
         await handler.flush()
         
-        mock_storage.write_funding_rates.assert_not_called()
+        assert storage.calls == []
 
     @pytest.mark.asyncio
     async def test_flush_with_data_writes_to_storage(self):
         """Проверяем, что flush() записывает батч в хранилище."""
-        mock_storage = AsyncMock()
-        handler = FundingRateHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = FundingRateHandler(storage=storage)
         
         handler.batch = [{"instId": "BTC-USDT-SWAP", "fundingRate": 0.0001}]
         
         await handler.flush()
         
-        mock_storage.write_funding_rates.assert_called_once()
+        assert len(storage.written("funding_rates")) == 1
         assert len(handler.batch) == 0
 
 
@@ -127,16 +171,16 @@ class TestOrderBookHandlerFlush:
     @pytest.mark.asyncio
     async def test_flush_clears_both_batches(self):
         """Проверяем, что flush() очищает оба батча (snapshots и updates)."""
-        mock_storage = AsyncMock()
-        handler = OrderBookHandler(storage=mock_storage)
+        storage = RecordingStorage()
+        handler = OrderBookHandler(storage=storage)
         
         handler.batch_snapshots = [{"test": "snapshot"}]
         handler.batch_updates = [{"test": "update"}]
         
         await handler.flush()
         
-        mock_storage.write_orderbook_snapshots.assert_called_once()
-        mock_storage.write_orderbook_updates.assert_called_once()
+        assert len(storage.written("orderbook_snapshots")) == 1
+        assert len(storage.written("orderbook_updates")) == 1
         assert len(handler.batch_snapshots) == 0
         assert len(handler.batch_updates) == 0
 
@@ -204,6 +248,47 @@ class TestClientFlushAllHandlers:
         client.orderbook_handler.flush.assert_called_once()
         client.funding_rate_handler.flush.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_flush_all_handlers_runs_flushes_concurrently(self):
+        """Проверяем, что flush() обработчиков выполняются параллельно, а не по очереди."""
+        from src.okx_hft.ws.client import OKXWebSocketClient
+
+        mock_settings = MagicMock()
+        mock_settings.BATCH_MAX_SIZE = 50
+        mock_settings.FLUSH_INTERVAL_MS = 100
+        mock_settings.SNAPSHOT_INTERVAL_SEC = 30.0
+        mock_settings.ORDERBOOK_MAX_DEPTH = 50
+
+        client = OKXWebSocketClient(settings=mock_settings)
+
+        handlers = [
+            client.trades_handler,
+            client.orderbook_handler,
+            client.funding_rate_handler,
+            client.mark_price_handler,
+            client.tickers_handler,
+            client.open_interest_handler,
+            client.index_tickers_handler,
+        ]
+        started = 0
+        all_started = asyncio.Event()
+
+        # Каждый flush ждёт, пока стартуют все остальные:
+        # при последовательном сбросе первый из них завис бы навсегда
+        async def blocking_flush():
+            nonlocal started
+            started += 1
+            if started == len(handlers):
+                all_started.set()
+            await all_started.wait()
+
+        for handler in handlers:
+            handler.flush = blocking_flush
+
+        await asyncio.wait_for(client.flush_all_handlers(), timeout=1.0)
+
+        assert started == len(handlers)
+
 
 class TestPeriodicFlushCancellation:
     """Тесты для поведения periodic_flush при отмене."""
@@ -272,9 +357,9 @@ class TestPeriodicFlushCancellation:
             }
         ]
         
-        # Мок хранилища
-        mock_storage = AsyncMock()
-        client.trades_handler.storage = mock_storage
+        # Хранилище-регистратор
+        storage = RecordingStorage()
+        client.trades_handler.storage = storage
         
         # Запускаем задачу periodic_flush
         task = asyncio.create_task(client.periodic_flush())
@@ -289,7 +374,106 @@ class TestPeriodicFlushCancellation:
             pass
         
         # Финальный сброс должен записать трейды
-        mock_storage.write_trades.assert_called_once()
+        assert len(storage.written("trades")) == 1
+
+    @pytest.mark.asyncio
+    async def test_cancel_during_flush_keeps_all_batches(self, monkeypatch):
+        """Проверяем, что отмена во время сброса не теряет батчи, уже забранные обработчиками."""
+        from src.okx_hft.ws.client import OKXWebSocketClient
+
+        mock_settings = MagicMock()
+        mock_settings.BATCH_MAX_SIZE = 50
+        mock_settings.FLUSH_INTERVAL_MS = 100
+        mock_settings.SNAPSHOT_INTERVAL_SEC = 30.0
+        mock_settings.ORDERBOOK_MAX_DEPTH = 50
+
+        client = OKXWebSocketClient(settings=mock_settings)
+
+        # Медленная запись: отмена придёт, пока все обработчики пишут
+        storage = RecordingStorage(delay=0.2)
+        client.trades_handler.storage = storage
+        client.funding_rate_handler.storage = storage
+        client.mark_price_handler.storage = storage
+        client.tickers_handler.storage = storage
+        client.open_interest_handler.storage = storage
+        client.orderbook_handler.storage = storage
+
+        client.trades_handler.batch = [{"type": "trade", "id": 1}]
+        client.funding_rate_handler.batch = [{"type": "funding", "id": 1}]
+        client.mark_price_handler.batch = [{"type": "mark", "id": 1}]
+        client.tickers_handler.batch = [{"type": "ticker", "id": 1}]
+        client.open_interest_handler.batch = [{"type": "oi", "id": 1}]
+        client.orderbook_handler.batch_snapshots = [{"type": "ob_snap", "id": 1}]
+
+        # Интервал periodic_flush (5 с) пропускаем: первый сброс стартует сразу
+        real_sleep = asyncio.sleep
+
+        async def fast_sleep(delay):
+            await real_sleep(0 if delay >= 1 else delay)
+
+        monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+
+        task = asyncio.create_task(client.periodic_flush())
+        await real_sleep(0.05)
+        task.cancel()
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # Страховочный сброс (как в run.py)
+        await client.flush_all_handlers()
+
+        for name in [
+            "trades", "funding_rates", "mark_prices",
+            "tickers", "open_interest", "orderbook_snapshots",
+        ]:
+            assert len(storage.written(name)) == 1, name
+
+
+class TestPeriodicFlushCadence:
+    """Тесты для расписания periodic_flush."""
+
+    @pytest.mark.asyncio
+    async def test_overrunning_flush_skips_missed_ticks(self, monkeypatch):
+        """Проверяем, что после сброса дольше интервала следующий ждёт тика сетки, а не стартует сразу."""
+        from src.okx_hft.ws.client import OKXWebSocketClient
+
+        mock_settings = MagicMock()
+        mock_settings.BATCH_MAX_SIZE = 50
+        mock_settings.FLUSH_INTERVAL_MS = 100
+        mock_settings.SNAPSHOT_INTERVAL_SEC = 30.0
+        mock_settings.ORDERBOOK_MAX_DEPTH = 50
+
+        client = OKXWebSocketClient(settings=mock_settings)
+
+        # Фейковые часы: sleep и сброс только сдвигают время
+        clock = 0.0
+        real_sleep = asyncio.sleep
+        flush_starts = []
+
+        async def fake_sleep(delay):
+            nonlocal clock
+            if len(flush_starts) >= 4:
+                raise asyncio.CancelledError
+            clock += delay
+            await real_sleep(0)
+
+        async def slow_flush():
+            nonlocal clock
+            flush_starts.append(clock)
+            clock += 12.0  # сброс дольше интервала в 5 секунд
+
+        loop = asyncio.get_running_loop()
+        monkeypatch.setattr(loop, "time", lambda: clock)
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        client.flush_all_handlers = slow_flush
+
+        await client.periodic_flush()
+
+        # Тики 10, 25, 40 пропущены; между сбросами остаются 3 секунды простоя
+        assert flush_starts[:4] == [5.0, 20.0, 35.0, 50.0]
 
 
 class TestShutdownScenario:
@@ -308,14 +492,14 @@ class TestShutdownScenario:
         
         client = OKXWebSocketClient(settings=mock_settings)
         
-        # Настраиваем мок-хранилище для всех обработчиков
-        mock_storage = AsyncMock()
-        client.trades_handler.storage = mock_storage
-        client.funding_rate_handler.storage = mock_storage
-        client.mark_price_handler.storage = mock_storage
-        client.tickers_handler.storage = mock_storage
-        client.open_interest_handler.storage = mock_storage
-        client.orderbook_handler.storage = mock_storage
+        # Одно хранилище-регистратор для всех обработчиков
+        storage = RecordingStorage()
+        client.trades_handler.storage = storage
+        client.funding_rate_handler.storage = storage
+        client.mark_price_handler.storage = storage
+        client.tickers_handler.storage = storage
+        client.open_interest_handler.storage = storage
+        client.orderbook_handler.storage = storage
         
         # Добавляем данные в каждый обработчик
         client.trades_handler.batch = [{"type": "trade", "id": 1}]
@@ -341,12 +525,12 @@ class TestShutdownScenario:
         await client.flush_all_handlers()
         
         # Проверяем, что все данные записаны
-        mock_storage.write_trades.assert_called()
-        mock_storage.write_funding_rates.assert_called()
-        mock_storage.write_mark_prices.assert_called()
-        mock_storage.write_tickers.assert_called()
-        mock_storage.write_open_interest.assert_called()
-        mock_storage.write_orderbook_snapshots.assert_called()
+        assert storage.written("trades")
+        assert storage.written("funding_rates")
+        assert storage.written("mark_prices")
+        assert storage.written("tickers")
+        assert storage.written("open_interest")
+        assert storage.written("orderbook_snapshots")
         
         # Все батчи должны быть пусты
         assert len(client.trades_handler.batch) == 0